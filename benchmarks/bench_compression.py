@@ -0,0 +1,116 @@
+"""CPU cost versus bytes saved when compressing post list pages.
+
+Measures a ListPosts page as the proxy sends it to clients (JSON, gzip and
+brotli as CompressionMiddleware applies them) and as post_service sends it
+to the proxy (protobuf, gzip and deflate as gRPC applies them). For each
+setting it prints the size, the time to compress and decompress, and the
+break-even bandwidth: on links slower than that, compressing gets the page
+across sooner than sending it as is.
+
+Needs the proxy's generated post_pb2, so run it after generating the stubs
+as proxy_service/Dockerfile does:
+
+    cd proxy_service
+    python -m grpc_tools.protoc -I. --python_out=. --grpc_python_out=. post.proto
+    python ../benchmarks/bench_compression.py --posts 100 --description-words 200
+"""
+import argparse
+import os
+import random
+import sys
+import time
+import zlib
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "proxy_service"))
+
+import post_pb2
+from compression import GzipEncoder, BrotliEncoder, brotli
+from fast_json import FastJSONResponse
+from grpc_client import list_response_to_dict
+
+WORDS = (
+    "the of and to in is was for on that with as by at from his an were are which this be or has had not but "
+    "first one their its new after who they have her she two been other when there all during into school time "
+    "may years more most only over city some world would where later up such used many can state about national "
+    "out known university united then made team film under year also series three season game album against "
+    "music released song system group company however called government party well several him work number part"
+).split()
+
+def sentence(rng, words):
+    return " ".join(rng.choice(WORDS) for _ in range(words)).capitalize() + "."
+
+def build_page(posts, description_words, seed=1):
+    rng = random.Random(seed)
+    response = post_pb2.ListPostsResponse(total_count=10000, page=1, page_size=posts, total_pages=10000 // posts)
+    now = int(time.time())
+    for index in range(posts):
+        post = response.posts.add(
+            id=10000 - index,
+            title=sentence(rng, 8),
+            description=sentence(rng, description_words),
+            creator_id=rng.randint(1, 500),
+            is_private=rng.random() < 0.1,
+            tags=rng.sample(WORDS, 3)
+        )
+        post.created_at.seconds = post.updated_at.seconds = now - index * 60
+    return response
+
+def best_time(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+def encode(make_encoder, data):
+    encoder = make_encoder()
+    return encoder.compress(data) + encoder.finish()
+
+def gunzip(data):
+    return zlib.decompress(data, 16 + zlib.MAX_WBITS)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--posts", type=int, default=100, help="posts on the page")
+    parser.add_argument("--description-words", type=int, default=200, help="words per description")
+    parser.add_argument("--repeat", type=int, default=50, help="runs per measurement, the fastest counts")
+    args = parser.parse_args()
+
+    page = build_page(args.posts, args.description_words)
+    proto = page.SerializeToString()
+    body = FastJSONResponse(list_response_to_dict(page)).body
+
+    # gRPC compresses each message whole, with zlib's default level
+    settings = [("json", "identity", body, None, None)]
+    for level in (1, 5, 9):
+        settings.append(("json", f"gzip level {level}", body,
+                         lambda level=level: encode(lambda: GzipEncoder(level), body), gunzip))
+    if brotli is not None:
+        for quality in (1, 4, 11):
+            settings.append(("json", f"br quality {quality}", body,
+                             lambda quality=quality: encode(lambda: BrotliEncoder(quality), body), brotli.decompress))
+    settings.append(("grpc", "none", proto, None, None))
+    settings.append(("grpc", "gzip", proto, lambda: encode(lambda: GzipEncoder(zlib.Z_DEFAULT_COMPRESSION), proto),
+                     gunzip))
+    settings.append(("grpc", "deflate", proto, lambda: zlib.compress(proto), zlib.decompress))
+
+    print(f"{args.posts} posts, {args.description_words} words per description")
+    print(f"{'hop':<6}{'setting':<16}{'bytes':>10}{'ratio':>8}{'compress us':>14}{'decompress us':>16}{'break-even MB/s':>18}")
+    for hop, name, data, compress, decompress in settings:
+        if compress is None:
+            print(f"{hop:<6}{name:<16}{len(data):>10}{1:>8.2f}{'-':>14}{'-':>16}{'-':>18}")
+            continue
+
+        compressed = compress()
+        assert decompress(compressed) == data
+
+        compress_time = best_time(compress, args.repeat)
+        decompress_time = best_time(lambda: decompress(compressed), args.repeat)
+        saved = len(data) - len(compressed)
+        break_even = saved / (compress_time + decompress_time) / 1e6
+        print(f"{hop:<6}{name:<16}{len(compressed):>10}{len(data) / len(compressed):>8.2f}"
+              f"{compress_time * 1e6:>14.0f}{decompress_time * 1e6:>16.0f}{break_even:>18.1f}")
+
+if __name__ == "__main__":
+    main()
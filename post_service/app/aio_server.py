@@ -0,0 +1,301 @@
+import asyncio
+import functools
+import os
+import grpc
+from sqlalchemy.exc import SQLAlchemyError
+from google.protobuf.empty_pb2 import Empty
+
+from app import database, queries, events, health
+from app.grpc_server import (
+    STREAM_BATCH_SIZE, BULK_INSERT_BATCH_SIZE, SEARCH_MAX_RANKED, count_cache, post_to_proto,
+    facet_cache, forget_viewer_counts, MAX_TAG_FACETS,
+    insert_statement_from_request,
+    update_statement_from_request, set_write_error, count_without_query,
+    page_params, build_list_response, batch_ids, build_batch_response,
+    create_values, validate_create_request, record_bulk_error, record_bulk_batch,
+    tag_filter, count_key, facet_limit, build_facets_response, search_params, build_search_response,
+    post_cache, post_write_stripe, cache_post, invalidate_post, readable_post, build_stats_response,
+    WATCH_BATCH_SIZE, event_to_proto, watch_position, set_pruned_error, invalidate_event_posts,
+    SERVER_OPTIONS,
+    POST_FIELDS, read_fields, GRPC_COMPRESSION,
+)
+import post_pb2
+import post_pb2_grpc
+
+# Upper bound on RPCs in flight, unset means unlimited
+GRPC_MAX_CONCURRENT_RPCS = os.getenv("GRPC_MAX_CONCURRENT_RPCS")
+
+# Runs a unary RPC inside its own async session, passed as the extra `db` argument
+def with_async_session(rpc):
+    @functools.wraps(rpc)
+    async def wrapper(self, request, context):
+        async with database.async_session_scope() as db:
+            return await rpc(self, request, context, db)
+    return wrapper
+
+# Same behaviour as app.grpc_server.PostServicer on top of grpc.aio and
+# an asyncpg engine, so one process serves many RPCs without extra threads
+class AsyncPostServicer(post_pb2_grpc.PostServiceServicer):
+    @with_async_session
+    async def CreatePost(self, request, context, db):
+        post = (await db.execute(insert_statement_from_request(request))).one()
+        await db.commit()
+        forget_viewer_counts(post.creator_id)
+
+        return post_to_proto(post)
+
+    @with_async_session
+    async def GetPost(self, request, context, db):
+        try:
+            fields = read_fields(request.read_mask)
+        except ValueError as e:
+            context.set_code(grpc.StatusCode.INVALID_ARGUMENT)
+            context.set_details(str(e))
+            return post_pb2.Post()
+
+        post = post_cache.get(request.id)
+
+        if post is None:
+            stripe = post_write_stripe(request.id)
+            post = (await db.execute(queries.get_post_statement(request.id, fields))).first()
+
+            if not post:
+                context.set_code(grpc.StatusCode.NOT_FOUND)
+                context.set_details(f"Post with ID {request.id} not found")
+                return post_pb2.Post()
+
+            if fields == POST_FIELDS:
+                post = post_to_proto(post)
+                cache_post(post, stripe)
+
+        return readable_post(context, post, request.user_id, fields)
+
+    @with_async_session
+    async def UpdatePost(self, request, context, db):
+        post = (await db.execute(update_statement_from_request(request))).first()
+        await db.commit()
+
+        if not post:
+            exists = await db.scalar(queries.post_exists_statement(request.id)) is not None
+            set_write_error(context, request, exists, "update")
+            return post_pb2.Post()
+
+        invalidate_post(post.id)
+        forget_viewer_counts(post.creator_id)
+
+        return post_to_proto(post)
+
+    @with_async_session
+    async def DeletePost(self, request, context, db):
+        deleted_id = await db.scalar(queries.delete_post_statement(request.id, request.user_id))
+        await db.commit()
+
+        if deleted_id is None:
+            exists = await db.scalar(queries.post_exists_statement(request.id)) is not None
+            set_write_error(context, request, exists, "delete")
+            return Empty()
+
+        invalidate_post(deleted_id)
+        forget_viewer_counts(request.user_id)
+
+        return Empty()
+
+    @with_async_session
+    async def ListPosts(self, request, context, db):
+        try:
+            page, page_size, cursor = page_params(request)
+            filters = tag_filter(request)
+            fields = read_fields(request.read_mask)
+        except ValueError as e:
+            context.set_code(grpc.StatusCode.INVALID_ARGUMENT)
+            context.set_details(str(e))
+            return post_pb2.ListPostsResponse()
+
+        counted = count_without_query(request, filters)
+        if counted is None:
+            total_count = await db.scalar(queries.count_posts_statement(request.user_id, **filters))
+            count_cache.set(count_key(request.user_id, filters), total_count)
+            counted = (total_count, post_pb2.COUNT_EXACT)
+
+        posts = (await db.execute(
+            queries.list_posts_statement(request.user_id, page_size, page, cursor, fields=fields, **filters)
+        )).all()
+
+        return build_list_response(posts, *counted, page, page_size, fields)
+
+    @with_async_session
+    async def BatchGetPosts(self, request, context, db):
+        try:
+            post_ids = batch_ids(request)
+        except ValueError as e:
+            context.set_code(grpc.StatusCode.INVALID_ARGUMENT)
+            context.set_details(str(e))
+            return post_pb2.BatchGetPostsResponse()
+
+        posts = (await db.execute(queries.batch_get_posts_statement(post_ids))).all() if post_ids else []
+
+        return build_batch_response(post_ids, posts, request.user_id)
+
+    @with_async_session
+    async def GetTagFacets(self, request, context, db):
+        try:
+            filters = tag_filter(request)
+        except ValueError as e:
+            context.set_code(grpc.StatusCode.INVALID_ARGUMENT)
+            context.set_details(str(e))
+            return post_pb2.GetTagFacetsResponse()
+
+        if filters["tags"]:
+            rows = (await db.execute(
+                queries.tag_facets_statement(request.user_id, facet_limit(request), **filters)
+            )).all()
+            return build_facets_response(rows)
+
+        rows = facet_cache.get(request.user_id)
+        if rows is None:
+            rows = (await db.execute(queries.tag_facets_statement(request.user_id, MAX_TAG_FACETS))).all()
+            facet_cache.set(request.user_id, rows)
+        return build_facets_response(rows[:facet_limit(request)])
+
+    @with_async_session
+    async def SearchPosts(self, request, context, db):
+        try:
+            query, page_size, cursor = search_params(request)
+        except ValueError as e:
+            context.set_code(grpc.StatusCode.INVALID_ARGUMENT)
+            context.set_details(str(e))
+            return post_pb2.SearchPostsResponse()
+
+        rows = (await db.execute(
+            queries.search_posts_statement(request.user_id, query, page_size, SEARCH_MAX_RANKED, cursor)
+        )).all()
+
+        return build_search_response(rows, page_size)
+
+    async def GetStats(self, request, context):
+        return build_stats_response()
+
+    # Ends when grpc.aio cancels the generator because the client went away
+    async def WatchPosts(self, request, context):
+        try:
+            position = watch_position(request)
+        except ValueError as e:
+            context.set_code(grpc.StatusCode.INVALID_ARGUMENT)
+            context.set_details(str(e))
+            return
+
+        notifier = events.get_async_notifier()
+
+        async with database.async_session_scope() as db:
+            if position is None:
+                position = (await db.scalar(queries.snapshot_xmin_statement()), 0)
+            elif position[0] <= await db.scalar(queries.pruned_xid_statement()):
+                set_pruned_error(context)
+                return
+
+        while True:
+            changed = notifier.watch()
+            async with database.async_session_scope() as db:
+                rows = (await db.execute(
+                    queries.post_events_statement(*position, WATCH_BATCH_SIZE)
+                )).all()
+
+            for row in rows:
+                yield event_to_proto(row)
+
+            if rows:
+                position = (rows[-1].xid, rows[-1].seq)
+            if len(rows) < WATCH_BATCH_SIZE:
+                await notifier.wait(changed)
+
+    async def StreamPosts(self, request, context):
+        statement = queries.stream_posts_statement(request.user_id, request.creator_id) \
+            .execution_options(yield_per=STREAM_BATCH_SIZE)
+
+        async with database.async_session_scope() as db:
+            async for post in await db.stream(statement):
+                yield post_to_proto(post)
+
+    @with_async_session
+    async def BulkCreatePosts(self, request_iterator, context, db):
+        response = post_pb2.BulkCreatePostsResponse()
+        batch = []
+
+        async def flush():
+            try:
+                created_ids = (await db.scalars(queries.insert_posts_statement(), [row for _, row in batch])).all()
+                await db.commit()
+            except SQLAlchemyError as e:
+                await db.rollback()
+                for index, _ in batch:
+                    record_bulk_error(response, index, str(e.orig or e))
+            else:
+                record_bulk_batch(response, batch, created_ids)
+            batch.clear()
+
+        index = 0
+        async for chunk in request_iterator:
+            for request in chunk.posts:
+                response.ids.append(0)
+                error = validate_create_request(request)
+                if error:
+                    record_bulk_error(response, index, error)
+                else:
+                    batch.append((index, create_values(request)))
+                    if len(batch) >= BULK_INSERT_BATCH_SIZE:
+                        await flush()
+                index += 1
+
+        if batch:
+            await flush()
+
+        return response
+
+async def invalidate_cached_posts_forever_async():
+    notifier = events.get_async_notifier()
+    position = None
+    while True:
+        try:
+            changed = notifier.watch()
+            async with database.async_session_scope() as db:
+                if position is None:
+                    position = (await db.scalar(queries.snapshot_xmin_statement()), 0)
+                rows = (await db.execute(
+                    queries.post_events_statement(*position, WATCH_BATCH_SIZE)
+                )).all()
+
+            invalidate_event_posts(rows)
+            if rows:
+                position = (rows[-1].xid, rows[-1].seq)
+            if len(rows) < WATCH_BATCH_SIZE:
+                await notifier.wait(changed)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"Invalidating cached posts failed: {e}")
+            await asyncio.sleep(1)
+
+async def serve_async():
+    database.init_db()
+
+    max_concurrent_rpcs = int(GRPC_MAX_CONCURRENT_RPCS) if GRPC_MAX_CONCURRENT_RPCS else None
+    server = grpc.aio.server(
+        maximum_concurrent_rpcs=max_concurrent_rpcs,
+        options=SERVER_OPTIONS,
+        compression=GRPC_COMPRESSION
+    )
+    post_pb2_grpc.add_PostServiceServicer_to_server(AsyncPostServicer(), server)
+    health_servicer, health_task = health.add_async_health_servicer(server)
+
+    server.add_insecure_port('[::]:50051')
+    await server.start()
+    # Referenced so the tasks are not garbage collected while the server runs
+    prune_task = asyncio.create_task(events.prune_post_events_forever_async())
+    invalidate_task = asyncio.create_task(invalidate_cached_posts_forever_async())
+
+    print("Post gRPC server (asyncio) started on port 50051")
+
+    await server.wait_for_termination()
+
+if __name__ == '__main__':
+    asyncio.run(serve_async())
@@ -0,0 +1,171 @@
+import asyncio
+import os
+import select
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import create_engine
+from sqlalchemy.pool import NullPool
+
+from app import database, queries
+
+# Change feed {
+# Watchers re-check the outbox at least this often, even without a NOTIFY
+# (e.g. while the listener reconnects or an older transaction holds back xmin)
+WATCH_POLL_INTERVAL = float(os.getenv("WATCH_POLL_INTERVAL", "1"))
+POST_EVENTS_RETENTION_HOURS = float(os.getenv("POST_EVENTS_RETENTION_HOURS", "24"))
+POST_EVENTS_PRUNE_INTERVAL = float(os.getenv("POST_EVENTS_PRUNE_INTERVAL", "600"))
+# Events deleted per statement; a run repeats batches until one comes back short
+POST_EVENTS_PRUNE_BATCH_SIZE = int(os.getenv("POST_EVENTS_PRUNE_BATCH_SIZE", "10000"))
+NOTIFY_CHANNEL = "post_events"
+# }
+
+def prune_before():
+    return datetime.now(timezone.utc) - timedelta(hours=POST_EVENTS_RETENTION_HOURS)
+
+# Each batch commits on its own, so the horizon moves with every one
+def prune_post_events():
+    before = prune_before()
+    with database.session_scope() as db:
+        while True:
+            deleted = db.scalar(queries.prune_post_events_statement(before, POST_EVENTS_PRUNE_BATCH_SIZE))
+            db.commit()
+            if deleted < POST_EVENTS_PRUNE_BATCH_SIZE:
+                break
+
+async def prune_post_events_async():
+    before = prune_before()
+    async with database.async_session_scope() as db:
+        while True:
+            deleted = await db.scalar(queries.prune_post_events_statement(before, POST_EVENTS_PRUNE_BATCH_SIZE))
+            await db.commit()
+            if deleted < POST_EVENTS_PRUNE_BATCH_SIZE:
+                break
+
+def prune_post_events_forever():
+    while True:
+        try:
+            prune_post_events()
+        except Exception as e:
+            print(f"Pruning post events failed: {e}")
+        time.sleep(POST_EVENTS_PRUNE_INTERVAL)
+
+async def prune_post_events_forever_async():
+    while True:
+        try:
+            await prune_post_events_async()
+        except Exception as e:
+            print(f"Pruning post events failed: {e}")
+        await asyncio.sleep(POST_EVENTS_PRUNE_INTERVAL)
+
+# One LISTEN connection per process, outside the pool, fanned out to every
+# WatchPosts stream. Waiters pass the generation they saw before reading the
+# outbox, so a NOTIFY arriving in between is not lost.
+class PostEventNotifier:
+    def __init__(self):
+        self.generation = 0
+        self._condition = threading.Condition()
+        self._engine = create_engine(database.SQLALCHEMY_DATABASE_URL, poolclass=NullPool)
+
+    def start(self):
+        threading.Thread(target=self._listen_forever, daemon=True).start()
+
+    def wait(self, generation, timeout=WATCH_POLL_INTERVAL):
+        with self._condition:
+            self._condition.wait_for(lambda: self.generation != generation, timeout)
+
+    def _wake(self):
+        with self._condition:
+            self.generation += 1
+            self._condition.notify_all()
+
+    def _listen_forever(self):
+        while True:
+            try:
+                self._listen()
+            except Exception as e:
+                print(f"Post event listener failed, reconnecting: {e}")
+                time.sleep(1)
+
+    def _listen(self):
+        connection = self._engine.raw_connection()
+        try:
+            driver_connection = connection.driver_connection
+            driver_connection.autocommit = True
+            driver_connection.cursor().execute(f"LISTEN {NOTIFY_CHANNEL}")
+            # Events may have been written while not listening
+            self._wake()
+
+            while True:
+                readable, _, _ = select.select([driver_connection], [], [], WATCH_POLL_INTERVAL)
+                if readable:
+                    driver_connection.poll()
+                    if driver_connection.notifies:
+                        driver_connection.notifies.clear()
+                        self._wake()
+        finally:
+            connection.close()
+
+# Same for the grpc.aio server, on an asyncpg connection
+class AsyncPostEventNotifier:
+    def __init__(self):
+        self._changed = asyncio.Event()
+        self._task = None
+
+    def start(self):
+        self._task = asyncio.get_running_loop().create_task(self._listen_forever())
+
+    # Returns the event to pass to wait(), taken before reading the outbox
+    def watch(self):
+        return self._changed
+
+    async def wait(self, changed, timeout=WATCH_POLL_INTERVAL):
+        try:
+            await asyncio.wait_for(changed.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    def _wake(self, *args):
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    async def _listen_forever(self):
+        import asyncpg
+
+        while True:
+            try:
+                connection = await asyncpg.connect(database.SQLALCHEMY_DATABASE_URL)
+                try:
+                    await connection.add_listener(NOTIFY_CHANNEL, self._wake)
+                    self._wake()
+                    while not connection.is_closed():
+                        await asyncio.sleep(WATCH_POLL_INTERVAL)
+                finally:
+                    await connection.close()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Post event listener failed, reconnecting: {e}")
+                await asyncio.sleep(1)
+
+# Created on first use: the thread notifier opens its own engine, and the
+# asyncio one must be built inside the server's event loop
+_notifier = None
+_notifier_lock = threading.Lock()
+_async_notifier = None
+
+def get_notifier():
+    global _notifier
+    with _notifier_lock:
+        if _notifier is None:
+            _notifier = PostEventNotifier()
+            _notifier.start()
+    return _notifier
+
+def get_async_notifier():
+    global _async_notifier
+    if _async_notifier is None:
+        _async_notifier = AsyncPostEventNotifier()
+        _async_notifier.start()
+    return _async_notifier
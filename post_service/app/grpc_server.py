@@ -1,216 +1,683 @@
 import grpc
 from concurrent import futures
 import time
-from datetime import datetime
+from datetime import datetime, timezone
 import math
+import functools
+import operator
+import os
+import threading
 from sqlalchemy.orm import Session
-from sqlalchemy import desc
-from google.protobuf.timestamp_pb2 import Timestamp
+from sqlalchemy.exc import SQLAlchemyError
 from google.protobuf.empty_pb2 import Empty
+from google.protobuf.field_mask_pb2 import FieldMask
 
-from app import models, schemas, database
+from app import database, queries, events, health
+from app.cache import TTLCache
 import post_pb2
 import post_pb2_grpc
 
-def get_db():
-    db = database.SessionLocal()
-    try:
-        return db
-    finally:
-        db.close()
+# Visible-post counts per viewer for CountMode.COUNT_CACHED {
+COUNT_CACHE_SIZE = int(os.getenv("COUNT_CACHE_SIZE", "10000"))
+COUNT_CACHE_TTL = float(os.getenv("COUNT_CACHE_TTL", "30"))
+count_cache = TTLCache(maxsize=COUNT_CACHE_SIZE, ttl=COUNT_CACHE_TTL)
+# }
+
+# Unfiltered tag facets per viewer {
+# Counting them reads every visible post, which no index helps with, so the
+# top MAX_TAG_FACETS are cached. A viewer's own writes drop theirs; other
+# users' writes show up after FACET_CACHE_TTL at the latest. Facets filtered
+# by tags come off the tags index and are not cached.
+FACET_CACHE_SIZE = int(os.getenv("FACET_CACHE_SIZE", "10000"))
+FACET_CACHE_TTL = float(os.getenv("FACET_CACHE_TTL", "60"))
+facet_cache = TTLCache(maxsize=FACET_CACHE_SIZE, ttl=FACET_CACHE_TTL)
+# }
+
+# GetPost read-through cache of Post messages by id {
+# Entries carry is_private and creator_id, so the permission check runs on
+# every hit. Writes through this process invalidate them at once, writes
+# through other replicas as soon as their post_events reach this one's
+# invalidation consumer; the TTL is the fallback if that consumer is down.
+POST_CACHE_SIZE = int(os.getenv("POST_CACHE_SIZE", "10000"))
+POST_CACHE_TTL = float(os.getenv("POST_CACHE_TTL", "30"))
+post_cache = TTLCache(maxsize=POST_CACHE_SIZE, ttl=POST_CACHE_TTL)
+
+# Writes bump the stripe of the post they touch. A read only caches its row
+# if the stripe did not move meanwhile, so a read racing an update cannot put
+# the old row back after the invalidation.
+POST_CACHE_STRIPES = 1024
+post_write_stripes = [0] * POST_CACHE_STRIPES
+# Held across the stripe check and the cache write, and by invalidations, so
+# no invalidation can land between the two
+post_cache_lock = threading.Lock()
+# }
+
+MAX_BATCH_GET_SIZE = int(os.getenv("MAX_BATCH_GET_SIZE", "100"))
+MAX_FILTER_TAGS = int(os.getenv("MAX_FILTER_TAGS", "10"))
+DEFAULT_TAG_FACETS = 20
+MAX_TAG_FACETS = 100
+MAX_SEARCH_QUERY_LENGTH = 256
+# Events read from the outbox per round-trip in WatchPosts
+WATCH_BATCH_SIZE = int(os.getenv("WATCH_BATCH_SIZE", "500"))
+# Each open watch holds a worker thread in the threaded server, so watches
+# past this many are refused to leave workers for unary calls
+WATCH_MAX_STREAMS = int(os.getenv("WATCH_MAX_STREAMS", str(max(1, database.GRPC_MAX_WORKERS // 2))))
+watch_slots = threading.BoundedSemaphore(WATCH_MAX_STREAMS)
+# Matches ranked per search, newest first; bounds the cost of broad queries
+SEARCH_MAX_RANKED = int(os.getenv("SEARCH_MAX_RANKED", "2000"))
+# Rows fetched per round-trip from the server-side cursor in StreamPosts
+STREAM_BATCH_SIZE = int(os.getenv("STREAM_BATCH_SIZE", "1000"))
+# Exports also hold a worker thread each, for as long as they run; together
+# with the watches they leave workers for unary calls by default
+STREAM_MAX_STREAMS = int(os.getenv("STREAM_MAX_STREAMS", str(max(1, database.GRPC_MAX_WORKERS // 4))))
+stream_slots = threading.BoundedSemaphore(STREAM_MAX_STREAMS)
+# Rows per multi-row INSERT in BulkCreatePosts
+BULK_INSERT_BATCH_SIZE = int(os.getenv("BULK_INSERT_BATCH_SIZE", "500"))
+
+# Client connections {
+# Connections are closed after this long (running streams are left to finish),
+# so clients re-resolve the service name and pick up replicas added since
+GRPC_MAX_CONNECTION_AGE_MS = int(os.getenv("GRPC_MAX_CONNECTION_AGE_MS", "300000"))
+SERVER_OPTIONS = [
+    ("grpc.max_connection_age_ms", GRPC_MAX_CONNECTION_AGE_MS),
+    # Accept the proxy's keepalive pings, also on idle connections
+    ("grpc.keepalive_permit_without_calls", 1),
+    ("grpc.http2.min_recv_ping_interval_without_data_ms", 10000),
+]
+
+# Algorithm answers are compressed with: "none", "gzip" or "deflate". Worth
+# it when the network to the proxy is slower than the compression, e.g. for
+# full list pages between hosts; see benchmarks/bench_compression.py.
+COMPRESSION_ALGORITHMS = {
+    "none": grpc.Compression.NoCompression,
+    "gzip": grpc.Compression.Gzip,
+    "deflate": grpc.Compression.Deflate,
+}
+GRPC_COMPRESSION = COMPRESSION_ALGORITHMS[os.getenv("GRPC_COMPRESSION", "none")]
+# }
+
+# Runs a unary RPC inside its own session, passed as the extra `db` argument
+def with_session(rpc):
+    @functools.wraps(rpc)
+    def wrapper(self, request, context):
+        with database.session_scope() as db:
+            return rpc(self, request, context, db)
+    return wrapper
 
 def timestamp_to_datetime(timestamp):
     return datetime.fromtimestamp(timestamp.seconds + timestamp.nanos / 1e9)
 
-def datetime_to_timestamp(dt):
-    timestamp = Timestamp()
-    timestamp.seconds = int(dt.timestamp())
-    timestamp.nanos = int((dt.timestamp() - timestamp.seconds) * 1e9)
-    return timestamp
+# Mapping rows to messages {
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+# Hot list pages map the same rows on every request
+TIMESTAMP_CACHE_SIZE = int(os.getenv("TIMESTAMP_CACHE_SIZE", "65536"))
+TIMESTAMP_FIELDS = {"created_at", "updated_at"}
+# }
+
+# (seconds, nanos) since the epoch of an aware datetime, computed exactly
+# from the offset instead of through a float
+@functools.lru_cache(maxsize=TIMESTAMP_CACHE_SIZE)
+def epoch_offset(dt):
+    delta = dt - EPOCH
+    return delta.days * 86400 + delta.seconds, delta.microseconds * 1000
+
+def set_timestamp(timestamp, dt):
+    timestamp.seconds, timestamp.nanos = epoch_offset(dt)
+
+# Helpers below are shared with the asyncio servicer in app.aio_server
+
+# Returns a function building Post messages with the given fields from Core
+# rows (anything with those attributes). The field split is worked out once
+# per mapper rather than once per row, and mappers are kept per field set.
+@functools.lru_cache(maxsize=None)
+def post_mapper(fields):
+    scalar_fields = tuple(field for field in fields if field not in TIMESTAMP_FIELDS)
+    # attrgetter needs a field and returns a bare value rather than a tuple
+    # for a single one
+    if len(scalar_fields) > 1:
+        get_scalars = operator.attrgetter(*scalar_fields)
+    else:
+        get_scalars = lambda row: tuple(getattr(row, field) for field in scalar_fields)
+    has_created_at = "created_at" in fields
+    has_updated_at = "updated_at" in fields
+
+    def to_proto(row):
+        post = post_pb2.Post(**dict(zip(scalar_fields, get_scalars(row))))
+        if has_created_at:
+            set_timestamp(post.created_at, row.created_at)
+        if has_updated_at:
+            set_timestamp(post.updated_at, row.updated_at)
+        return post
+
+    return to_proto
+
+POST_FIELDS = tuple(column.name for column in queries.post_columns)
+post_to_proto = post_mapper(POST_FIELDS)
+
+# Post fields a read mask selects, in message order; every field for an
+# empty mask. Raises ValueError for paths that are not Post fields.
+def read_fields(read_mask):
+    if not read_mask.paths:
+        return POST_FIELDS
+    unknown = set(read_mask.paths).difference(POST_FIELDS)
+    if unknown:
+        raise ValueError(f"Unknown read_mask fields: {', '.join(sorted(unknown))}")
+    return tuple(field for field in POST_FIELDS if field in read_mask.paths)
+
+def post_write_stripe(post_id):
+    return post_write_stripes[post_id % POST_CACHE_STRIPES]
+
+def cache_post(post, stripe):
+    with post_cache_lock:
+        if post_write_stripe(post.id) == stripe:
+            post_cache.set(post.id, post)
+
+def invalidate_post(post_id):
+    with post_cache_lock:
+        post_write_stripes[post_id % POST_CACHE_STRIPES] += 1
+        post_cache.pop(post_id)
+
+# Returns the post with only `fields` set if the user may read it, otherwise
+# sets the error and returns an empty Post. `post` is either a cached Post
+# or a row read with those fields.
+def readable_post(context, post, user_id, fields=POST_FIELDS):
+    if post.is_private and post.creator_id != user_id:
+        context.set_code(grpc.StatusCode.PERMISSION_DENIED)
+        context.set_details("You don't have permission to access this post")
+        return post_pb2.Post()
+    if not isinstance(post, post_pb2.Post):
+        return post_mapper(fields)(post)
+    if fields == POST_FIELDS:
+        return post
+    narrowed = post_pb2.Post()
+    FieldMask(paths=fields).MergeMessage(post, narrowed)
+    return narrowed
+
+def build_stats_response():
+    response = post_pb2.ServiceStats()
+    for name, cache in (("post_cache", post_cache), ("count_cache", count_cache), ("facet_cache", facet_cache)):
+        response.caches[name].CopyFrom(post_pb2.CacheStats(**cache.stats()))
+    return response
+
+EVENT_TYPES = {
+    "created": post_pb2.POST_CREATED,
+    "updated": post_pb2.POST_UPDATED,
+    "deleted": post_pb2.POST_DELETED,
+}
+
+def event_to_proto(event):
+    response = post_pb2.PostEvent(
+        seq=event.seq,
+        type=EVENT_TYPES[event.event_type],
+        post_id=event.post_id,
+        creator_id=event.creator_id,
+        resume_token=queries.encode_event_token(event.xid, event.seq)
+    )
+    if event.updated_at is not None:
+        set_timestamp(response.updated_at, event.updated_at)
+    return response
+
+# Returns the (xid, seq) position a watch resumes after, or None to start
+# from now. Raises ValueError for a malformed token.
+def watch_position(request):
+    if not request.resume_token:
+        return None
+    return queries.decode_event_token(request.resume_token)
+
+# Runs a server-streaming generator while holding one of `slots`, or fails
+# with RESOURCE_EXHAUSTED when none is free
+def hold_slot(slots, context, details, stream):
+    if not slots.acquire(blocking=False):
+        context.set_code(grpc.StatusCode.RESOURCE_EXHAUSTED)
+        context.set_details(details)
+        return
+
+    try:
+        yield from stream
+    finally:
+        slots.release()
+
+def set_pruned_error(context):
+    context.set_code(grpc.StatusCode.OUT_OF_RANGE)
+    context.set_details("Events after this resume token were pruned, resync and watch without a token")
+
+# Each replica tails the outbox from its start, while post_cache is still
+# empty, and drops the posts updated or deleted through any replica
+def invalidate_event_posts(rows):
+    for row in rows:
+        if row.event_type != "created":
+            invalidate_post(row.post_id)
+
+def invalidate_cached_posts_forever():
+    notifier = events.get_notifier()
+    position = None
+    while True:
+        try:
+            generation = notifier.generation
+            with database.session_scope() as db:
+                if position is None:
+                    position = (db.scalar(queries.snapshot_xmin_statement()), 0)
+                rows = db.execute(queries.post_events_statement(*position, WATCH_BATCH_SIZE)).all()
+
+            invalidate_event_posts(rows)
+            if rows:
+                position = (rows[-1].xid, rows[-1].seq)
+            if len(rows) < WATCH_BATCH_SIZE:
+                notifier.wait(generation)
+        except Exception as e:
+            print(f"Invalidating cached posts failed: {e}")
+            time.sleep(1)
+
+def create_values(request):
+    return {
+        "title": request.title,
+        "description": request.description,
+        "creator_id": request.creator_id,
+        "is_private": request.is_private,
+        "tags": list(request.tags),
+    }
+
+def insert_statement_from_request(request):
+    return queries.insert_post_statement(**create_values(request))
+
+# Checks what the database would reject, so one bad item does not fail the
+# whole bulk batch
+def validate_create_request(request):
+    if not request.title or len(request.title) > 255:
+        return "title must be between 1 and 255 characters"
+    if request.creator_id <= 0:
+        return "creator_id is required"
+    return None
+
+def record_bulk_error(response, index, message):
+    response.errors.add(index=index, message=message)
+    response.failed_count += 1
+
+def record_bulk_batch(response, batch, created_ids):
+    for (index, row), post_id in zip(batch, created_ids):
+        response.ids[index] = post_id
+    response.created_count += len(batch)
+    for creator_id in {row["creator_id"] for _, row in batch}:
+        forget_viewer_counts(creator_id)
+
+def update_statement_from_request(request):
+    values = {"is_private": request.is_private}
+    if request.title:
+        values["title"] = request.title
+    if request.description:
+        values["description"] = request.description
+    if request.tags:
+        values["tags"] = list(request.tags)
+
+    return queries.update_post_statement(request.id, request.user_id, values)
+
+def set_write_error(context, request, exists, action):
+    if not exists:
+        context.set_code(grpc.StatusCode.NOT_FOUND)
+        context.set_details(f"Post with ID {request.id} not found")
+    else:
+        context.set_code(grpc.StatusCode.PERMISSION_DENIED)
+        context.set_details(f"You don't have permission to {action} this post")
+
+# Returns the tag filter as keyword arguments for the list queries. Raises
+# ValueError when too many tags are given.
+def tag_filter(request):
+    tags = list(dict.fromkeys(tag for tag in request.tags if tag))
+    if len(tags) > MAX_FILTER_TAGS:
+        raise ValueError(f"At most {MAX_FILTER_TAGS} tags can be filtered on")
+    return {"tags": tags, "match_all": request.tag_match == post_pb2.TAG_MATCH_ALL}
+
+# Drops what is cached for a viewer whose posts changed
+def forget_viewer_counts(user_id):
+    count_cache.pop(user_id)
+    facet_cache.pop(user_id)
+
+# Unfiltered counts are keyed by viewer alone, so a viewer's own writes can
+# drop them; filtered ones are left to expire
+def count_key(user_id, filters):
+    if not filters["tags"]:
+        return user_id
+    return user_id, filters["match_all"], tuple(sorted(filters["tags"]))
+
+# Returns (total_count, count_mode) when the request can be answered without
+# a count query, otherwise None
+def count_without_query(request, filters):
+    if request.count_mode == post_pb2.COUNT_NONE:
+        return 0, post_pb2.COUNT_NONE
+    if request.count_mode == post_pb2.COUNT_CACHED:
+        total_count = count_cache.get(count_key(request.user_id, filters))
+        if total_count is not None:
+            return total_count, post_pb2.COUNT_CACHED
+    return None
+
+# Returns (page, page_size, cursor); page is 0 in keyset mode. Raises
+# ValueError for a malformed cursor.
+def page_params(request):
+    page_size = max(1, min(100, request.page_size))  # Limit page size
+    if request.cursor:
+        return 0, page_size, queries.decode_cursor(request.cursor)
+    return max(1, request.page), page_size, None
+
+def build_list_response(posts, total_count, count_mode, page, page_size, fields=POST_FIELDS):
+    # One extra row tells whether there is a next page
+    next_cursor = queries.encode_cursor(posts[page_size - 1]) if len(posts) > page_size else ""
+
+    response = post_pb2.ListPostsResponse(
+        total_count=total_count,
+        page=page,
+        page_size=page_size,
+        total_pages=math.ceil(total_count / page_size),
+        next_cursor=next_cursor,
+        count_mode=count_mode
+    )
+    to_proto = post_mapper(fields)
+    response.posts.extend(to_proto(post) for post in posts[:page_size])
+
+    return response
+
+# Returns the distinct requested ids in request order. Raises ValueError when
+# the batch is too large.
+def batch_ids(request):
+    post_ids = list(dict.fromkeys(request.ids))
+    if len(post_ids) > MAX_BATCH_GET_SIZE:
+        raise ValueError(f"At most {MAX_BATCH_GET_SIZE} ids can be requested at once")
+    return post_ids
+
+def build_batch_response(post_ids, posts, user_id):
+    posts_by_id = {post.id: post for post in posts}
+    response = post_pb2.BatchGetPostsResponse()
+
+    for post_id in post_ids:
+        post = posts_by_id.get(post_id)
+        if post is None:
+            response.not_found_ids.append(post_id)
+        elif post.is_private and post.creator_id != user_id:
+            response.denied_ids.append(post_id)
+        else:
+            response.posts.append(post_to_proto(post))
+
+    return response
+
+def facet_limit(request):
+    return max(1, min(MAX_TAG_FACETS, request.limit or DEFAULT_TAG_FACETS))
+
+def build_facets_response(rows):
+    response = post_pb2.GetTagFacetsResponse()
+    for tag, count in rows:
+        response.facets.add(tag=tag, count=count)
+    return response
+
+# Returns (query, page_size, cursor). Raises ValueError for an empty or overlong
+# query or a malformed cursor.
+def search_params(request):
+    query = request.query.strip()
+    if not query:
+        raise ValueError("Search query must not be empty")
+    if len(query) > MAX_SEARCH_QUERY_LENGTH:
+        raise ValueError(f"Search query must be at most {MAX_SEARCH_QUERY_LENGTH} characters")
+    page_size = max(1, min(100, request.page_size or 10))
+    cursor = queries.decode_search_cursor(request.cursor) if request.cursor else None
+    return query, page_size, cursor
+
+def build_search_response(rows, page_size):
+    response = post_pb2.SearchPostsResponse(truncated=bool(rows) and rows[0].truncated)
+    if len(rows) > page_size:
+        last = rows[page_size - 1]
+        response.next_cursor = queries.encode_search_cursor(last.rank, last.id)
+    for row in rows[:page_size]:
+        response.hits.add(post=post_to_proto(row), rank=row.rank)
+    return response
 
 class PostServicer(post_pb2_grpc.PostServiceServicer):
-    def CreatePost(self, request, context):
-        db = get_db()
-        
-        # Create new post
-        new_post = models.Post(
-            title=request.title,
-            description=request.description,
-            creator_id=request.creator_id,
-            is_private=request.is_private,
-            tags=list(request.tags),
-            created_at=datetime.utcnow(),
-            updated_at=datetime.utcnow()
-        )
-        
-        db.add(new_post)
+    @with_session
+    def CreatePost(self, request, context, db):
+        post = db.execute(insert_statement_from_request(request)).one()
         db.commit()
-        db.refresh(new_post)
-        
-        # Convert to gRPC response
-        response = post_pb2.Post(
-            id=new_post.id,
-            title=new_post.title,
-            description=new_post.description,
-            creator_id=new_post.creator_id,
-            is_private=new_post.is_private,
-            tags=new_post.tags
-        )
-        
-        response.created_at.CopyFrom(datetime_to_timestamp(new_post.created_at))
-        response.updated_at.CopyFrom(datetime_to_timestamp(new_post.updated_at))
-        
-        return response
-    
-    def GetPost(self, request, context):
-        db = get_db()
-        
-        # Get post by ID
-        post = db.query(models.Post).filter(models.Post.id == request.id).first()
-
-        if not post:
-            context.set_code(grpc.StatusCode.NOT_FOUND)
-            context.set_details(f"Post with ID {request.id} not found")
-            return post_pb2.Post()
-
-        if post.is_private and post.creator_id != request.user_id:
-            context.set_code(grpc.StatusCode.PERMISSION_DENIED)
-            context.set_details("You don't have permission to access this post")
-            return post_pb2.Post()
-        
-        response = post_pb2.Post(
-            id=post.id,
-            title=post.title,
-            description=post.description,
-            creator_id=post.creator_id,
-            is_private=post.is_private,
-            tags=post.tags
-        )
-        
-        response.created_at.CopyFrom(datetime_to_timestamp(post.created_at))
-        response.updated_at.CopyFrom(datetime_to_timestamp(post.updated_at))
-        
-        return response
-    
-    def UpdatePost(self, request, context):
-        db = get_db()
-        
-        # Get post by ID
-        post = db.query(models.Post).filter(models.Post.id == request.id).first()
-        
-        if not post:
-            context.set_code(grpc.StatusCode.NOT_FOUND)
-            context.set_details(f"Post with ID {request.id} not found")
+        forget_viewer_counts(post.creator_id)
+
+        return post_to_proto(post)
+
+    # Sessions connect lazily, so a cache hit never checks out a connection.
+    # A read mask narrows cache hits; misses then read only the masked
+    # columns and skip the cache, which holds full posts.
+    @with_session
+    def GetPost(self, request, context, db):
+        try:
+            fields = read_fields(request.read_mask)
+        except ValueError as e:
+            context.set_code(grpc.StatusCode.INVALID_ARGUMENT)
+            context.set_details(str(e))
             return post_pb2.Post()
 
-        if post.creator_id != request.user_id:
-            context.set_code(grpc.StatusCode.PERMISSION_DENIED)
-            context.set_details("You don't have permission to update this post")
-            return post_pb2.Post()
+        post = post_cache.get(request.id)
 
-        if request.title:
-            post.title = request.title
-        if request.description:
-            post.description = request.description
+        if post is None:
+            stripe = post_write_stripe(request.id)
+            post = db.execute(queries.get_post_statement(request.id, fields)).first()
 
-        post.is_private = request.is_private
+            if not post:
+                context.set_code(grpc.StatusCode.NOT_FOUND)
+                context.set_details(f"Post with ID {request.id} not found")
+                return post_pb2.Post()
 
-        if request.tags:
-            post.tags = list(request.tags)
+            if fields == POST_FIELDS:
+                post = post_to_proto(post)
+                cache_post(post, stripe)
 
-        post.updated_at = datetime.utcnow()
+        return readable_post(context, post, request.user_id, fields)
 
+    @with_session
+    def UpdatePost(self, request, context, db):
+        post = db.execute(update_statement_from_request(request)).first()
         db.commit()
-        db.refresh(post)
-
-        response = post_pb2.Post(
-            id=post.id,
-            title=post.title,
-            description=post.description,
-            creator_id=post.creator_id,
-            is_private=post.is_private,
-            tags=post.tags
-        )
-        
-        response.created_at.CopyFrom(datetime_to_timestamp(post.created_at))
-        response.updated_at.CopyFrom(datetime_to_timestamp(post.updated_at))
 
-        return response
+        if not post:
+            exists = db.scalar(queries.post_exists_statement(request.id)) is not None
+            set_write_error(context, request, exists, "update")
+            return post_pb2.Post()
 
-    def DeletePost(self, request, context):
-        db = get_db()
+        invalidate_post(post.id)
+        forget_viewer_counts(post.creator_id)
 
+        return post_to_proto(post)
 
-        post = db.query(models.Post).filter(models.Post.id == request.id).first()
-        
-        if not post:
-            context.set_code(grpc.StatusCode.NOT_FOUND)
-            context.set_details(f"Post with ID {request.id} not found")
-            return Empty()
+    @with_session
+    def DeletePost(self, request, context, db):
+        deleted_id = db.scalar(queries.delete_post_statement(request.id, request.user_id))
+        db.commit()
 
-        if post.creator_id != request.user_id:
-            context.set_code(grpc.StatusCode.PERMISSION_DENIED)
-            context.set_details("You don't have permission to delete this post")
+        if deleted_id is None:
+            exists = db.scalar(queries.post_exists_statement(request.id)) is not None
+            set_write_error(context, request, exists, "delete")
             return Empty()
 
-        db.delete(post)
-        db.commit()
+        invalidate_post(deleted_id)
+        forget_viewer_counts(request.user_id)
 
         return Empty()
 
-    def ListPosts(self, request, context):
-        db = get_db()
-
-        query = db.query(models.Post)
-
-        if request.user_id:
-            query = query.filter(
-                (models.Post.is_private == False) | 
-                (models.Post.creator_id == request.user_id)
-            )
-        else:
-            query = query.filter(models.Post.is_private == False)
-
-        total_count = query.count()
-
-        page = max(1, request.page)
-        page_size = max(1, min(100, request.page_size))  # Limit page size
-        total_pages = math.ceil(total_count / page_size)
-
-        posts = query.order_by(desc(models.Post.created_at)) \
-                    .offset((page - 1) * page_size) \
-                    .limit(page_size) \
-                    .all()
+    @with_session
+    def ListPosts(self, request, context, db):
+        try:
+            page, page_size, cursor = page_params(request)
+            filters = tag_filter(request)
+            fields = read_fields(request.read_mask)
+        except ValueError as e:
+            context.set_code(grpc.StatusCode.INVALID_ARGUMENT)
+            context.set_details(str(e))
+            return post_pb2.ListPostsResponse()
+
+        counted = count_without_query(request, filters)
+        if counted is None:
+            total_count = db.scalar(queries.count_posts_statement(request.user_id, **filters))
+            count_cache.set(count_key(request.user_id, filters), total_count)
+            counted = (total_count, post_pb2.COUNT_EXACT)
+
+        posts = db.execute(
+            queries.list_posts_statement(request.user_id, page_size, page, cursor, fields=fields, **filters)
+        ).all()
+
+        return build_list_response(posts, *counted, page, page_size, fields)
+
+    @with_session
+    def BatchGetPosts(self, request, context, db):
+        try:
+            post_ids = batch_ids(request)
+        except ValueError as e:
+            context.set_code(grpc.StatusCode.INVALID_ARGUMENT)
+            context.set_details(str(e))
+            return post_pb2.BatchGetPostsResponse()
+
+        posts = db.execute(queries.batch_get_posts_statement(post_ids)).all() if post_ids else []
+
+        return build_batch_response(post_ids, posts, request.user_id)
+
+    @with_session
+    def GetTagFacets(self, request, context, db):
+        try:
+            filters = tag_filter(request)
+        except ValueError as e:
+            context.set_code(grpc.StatusCode.INVALID_ARGUMENT)
+            context.set_details(str(e))
+            return post_pb2.GetTagFacetsResponse()
+
+        if filters["tags"]:
+            rows = db.execute(
+                queries.tag_facets_statement(request.user_id, facet_limit(request), **filters)
+            ).all()
+            return build_facets_response(rows)
+
+        rows = facet_cache.get(request.user_id)
+        if rows is None:
+            rows = db.execute(queries.tag_facets_statement(request.user_id, MAX_TAG_FACETS)).all()
+            facet_cache.set(request.user_id, rows)
+        return build_facets_response(rows[:facet_limit(request)])
+
+    @with_session
+    def SearchPosts(self, request, context, db):
+        try:
+            query, page_size, cursor = search_params(request)
+        except ValueError as e:
+            context.set_code(grpc.StatusCode.INVALID_ARGUMENT)
+            context.set_details(str(e))
+            return post_pb2.SearchPostsResponse()
+
+        rows = db.execute(
+            queries.search_posts_statement(request.user_id, query, page_size, SEARCH_MAX_RANKED, cursor)
+        ).all()
+
+        return build_search_response(rows, page_size)
+
+    def GetStats(self, request, context):
+        return build_stats_response()
+
+    # Tails the post_events outbox, woken by NOTIFY and polling every
+    # WATCH_POLL_INTERVAL otherwise. Each open watch holds a worker thread,
+    # hence at most WATCH_MAX_STREAMS of them.
+    def WatchPosts(self, request, context):
+        return hold_slot(
+            watch_slots, context, f"Too many open watches, at most {WATCH_MAX_STREAMS}",
+            self._watch_posts(request, context)
+        )
 
-        response = post_pb2.ListPostsResponse(
-            total_count=total_count,
-            page=page,
-            page_size=page_size,
-            total_pages=total_pages
+    def _watch_posts(self, request, context):
+        try:
+            position = watch_position(request)
+        except ValueError as e:
+            context.set_code(grpc.StatusCode.INVALID_ARGUMENT)
+            context.set_details(str(e))
+            return
+
+        notifier = events.get_notifier()
+
+        with database.session_scope() as db:
+            if position is None:
+                position = (db.scalar(queries.snapshot_xmin_statement()), 0)
+            elif position[0] <= db.scalar(queries.pruned_xid_statement()):
+                set_pruned_error(context)
+                return
+
+        while context.is_active():
+            generation = notifier.generation
+            with database.session_scope() as db:
+                rows = db.execute(queries.post_events_statement(*position, WATCH_BATCH_SIZE)).all()
+
+            for row in rows:
+                yield event_to_proto(row)
+
+            if rows:
+                position = (rows[-1].xid, rows[-1].seq)
+            if len(rows) < WATCH_BATCH_SIZE:
+                notifier.wait(generation)
+
+    # Streams through a server-side cursor, so memory stays bounded by
+    # STREAM_BATCH_SIZE however many posts match. The session has to live as
+    # long as the generator, hence no with_session here. Each export holds a
+    # worker thread, hence at most STREAM_MAX_STREAMS of them.
+    def StreamPosts(self, request, context):
+        return hold_slot(
+            stream_slots, context, f"Too many running exports, at most {STREAM_MAX_STREAMS}",
+            self._stream_posts(request)
         )
 
-        for post in posts:
-            post_proto = post_pb2.Post(
-                id=post.id,
-                title=post.title,
-                description=post.description,
-                creator_id=post.creator_id,
-                is_private=post.is_private,
-                tags=post.tags
-            )
-            
-            post_proto.created_at.CopyFrom(datetime_to_timestamp(post.created_at))
-            post_proto.updated_at.CopyFrom(datetime_to_timestamp(post.updated_at))
-
-            response.posts.append(post_proto)
+    def _stream_posts(self, request):
+        statement = queries.stream_posts_statement(request.user_id, request.creator_id) \
+            .execution_options(yield_per=STREAM_BATCH_SIZE)
+
+        with database.session_scope() as db:
+            for post in db.execute(statement):
+                yield post_to_proto(post)
+
+    # Client-streaming: valid posts are grouped into multi-row inserts of
+    # BULK_INSERT_BATCH_SIZE, each committed on its own. A failing batch is
+    # rolled back and reported per item without stopping the stream.
+    @with_session
+    def BulkCreatePosts(self, request_iterator, context, db):
+        response = post_pb2.BulkCreatePostsResponse()
+        batch = []
+
+        def flush():
+            try:
+                created_ids = db.scalars(queries.insert_posts_statement(), [row for _, row in batch]).all()
+                db.commit()
+            except SQLAlchemyError as e:
+                db.rollback()
+                for index, _ in batch:
+                    record_bulk_error(response, index, str(e.orig or e))
+            else:
+                record_bulk_batch(response, batch, created_ids)
+            batch.clear()
+
+        index = 0
+        for chunk in request_iterator:
+            for request in chunk.posts:
+                response.ids.append(0)
+                error = validate_create_request(request)
+                if error:
+                    record_bulk_error(response, index, error)
+                else:
+                    batch.append((index, create_values(request)))
+                    if len(batch) >= BULK_INSERT_BATCH_SIZE:
+                        flush()
+                index += 1
+
+        if batch:
+            flush()
 
         return response
 
 def serve():
     database.init_db()
-
-    server = grpc.server(futures.ThreadPoolExecutor(max_workers=10))
+    threading.Thread(target=events.prune_post_events_forever, daemon=True).start()
+    threading.Thread(target=invalidate_cached_posts_forever, daemon=True).start()
+
+    server = grpc.server(
+        futures.ThreadPoolExecutor(max_workers=database.GRPC_MAX_WORKERS),
+        options=SERVER_OPTIONS,
+        compression=GRPC_COMPRESSION
+    )
     post_pb2_grpc.add_PostServiceServicer_to_server(PostServicer(), server)
+    health.add_health_servicer(server)
 
     server.add_insecure_port('[::]:50051')
     server.start()
@@ -0,0 +1,66 @@
+import asyncio
+import os
+import threading
+import time
+
+from grpc_health.v1 import health, health_pb2, health_pb2_grpc
+from sqlalchemy import create_engine, select
+from sqlalchemy.pool import NullPool
+
+from app import database
+import post_pb2
+
+# Health {
+# Reported through grpc.health.v1. The proxy's channels check it per address
+# (healthCheckConfig), so round_robin skips a replica that cannot reach the
+# database while its connections still accept calls.
+HEALTH_CHECK_INTERVAL = float(os.getenv("HEALTH_CHECK_INTERVAL", "5"))
+SERVICE_NAME = post_pb2.DESCRIPTOR.services_by_name["PostService"].full_name
+# }
+
+SERVING = health_pb2.HealthCheckResponse.SERVING
+NOT_SERVING = health_pb2.HealthCheckResponse.NOT_SERVING
+
+# Checked on its own connection, outside the pool: a pool exhausted by busy
+# workers means load, not an unhealthy replica
+_engine = create_engine(
+    database.SQLALCHEMY_DATABASE_URL,
+    poolclass=NullPool,
+    connect_args={"connect_timeout": max(1, int(HEALTH_CHECK_INTERVAL))}
+)
+
+def database_status():
+    try:
+        with _engine.connect() as connection:
+            connection.execute(select(1))
+        return SERVING
+    except Exception as e:
+        print(f"Health check failed: {e}")
+        return NOT_SERVING
+
+def add_health_servicer(server):
+    servicer = health.HealthServicer()
+    health_pb2_grpc.add_HealthServicer_to_server(servicer, server)
+    threading.Thread(target=report_health_forever, args=(servicer,), daemon=True).start()
+    return servicer
+
+def report_health_forever(servicer):
+    while True:
+        status = database_status()
+        servicer.set(SERVICE_NAME, status)
+        servicer.set(health.OVERALL_HEALTH, status)
+        time.sleep(HEALTH_CHECK_INTERVAL)
+
+# Same for the grpc.aio server; the check runs in a thread to keep the
+# event loop free. Call from inside the server's event loop.
+def add_async_health_servicer(server):
+    servicer = health.aio.HealthServicer()
+    health_pb2_grpc.add_HealthServicer_to_server(servicer, server)
+    return servicer, asyncio.get_running_loop().create_task(report_health_forever_async(servicer))
+
+async def report_health_forever_async(servicer):
+    while True:
+        status = await asyncio.to_thread(database_status)
+        await servicer.set(SERVICE_NAME, status)
+        await servicer.set(health.OVERALL_HEALTH, status)
+        await asyncio.sleep(HEALTH_CHECK_INTERVAL)
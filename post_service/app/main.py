@@ -1,4 +1,14 @@
+import asyncio
+import os
+
 from app.grpc_server import serve
+from app.aio_server import serve_async
+
+# "thread" runs the ThreadPoolExecutor server, "aio" the grpc.aio one
+POST_SERVER_MODE = os.getenv("POST_SERVER_MODE", "thread")
 
 if __name__ == "__main__":
-    serve()
+    if POST_SERVER_MODE == "aio":
+        asyncio.run(serve_async())
+    else:
+        serve()
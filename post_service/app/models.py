@@ -1,11 +1,13 @@
-from sqlalchemy import Column, Integer, String, DateTime, Boolean, Table, ForeignKey, ARRAY
+from sqlalchemy import Column, Integer, BigInteger, String, DateTime, Boolean, Table, ForeignKey, Index, Computed
+from sqlalchemy.dialects.postgresql import ARRAY, TSVECTOR
+from sqlalchemy.orm import deferred
 from sqlalchemy.sql import func
 from app.database import Base
 
 class Post(Base):
     __tablename__ = "posts"
 
-    id = Column(Integer, primary_key=True, index=True)
+    id = Column(Integer, primary_key=True)
     title = Column(String(255), nullable=False)
     description = Column(String, nullable=False)
     creator_id = Column(Integer, nullable=False)
@@ -13,3 +15,37 @@ class Post(Base):
     updated_at = Column(DateTime(timezone=True), onupdate=func.now(), server_default=func.now())
     is_private = Column(Boolean, default=False)
     tags = Column(ARRAY(String), default=[])
+    # Maintained by Postgres from title and description, only read by search
+    search_vector = deferred(Column(TSVECTOR, Computed(
+        "setweight(to_tsvector('english', coalesce(title, '')), 'A') || "
+        "setweight(to_tsvector('english', coalesce(description, '')), 'B')",
+        persisted=True
+    )))
+
+    # Created by the migrations in migrations/versions; declared here so the
+    # metadata matches the database
+    __table_args__ = (
+        Index("ix_posts_public_created", created_at.desc(), id.desc(), postgresql_where=~is_private),
+        Index("ix_posts_creator_created", creator_id, created_at.desc(), id.desc()),
+        Index("ix_posts_tags", tags, postgresql_using="gin"),
+        Index("ix_posts_search_vector", search_vector, postgresql_using="gin"),
+    )
+
+# Outbox written by triggers on posts, see migrations/versions/0005_post_events.py
+class PostEvent(Base):
+    __tablename__ = "post_events"
+
+    seq = Column(BigInteger, primary_key=True)
+    xid = Column(BigInteger, nullable=False)
+    event_type = Column(String(16), nullable=False)
+    post_id = Column(Integer, nullable=False)
+    creator_id = Column(Integer, nullable=False)
+    updated_at = Column(DateTime(timezone=True))
+    occurred_at = Column(DateTime(timezone=True), nullable=False)
+
+post_events_horizon = Table(
+    "post_events_horizon",
+    Base.metadata,
+    Column("id", Boolean, primary_key=True),
+    Column("pruned_xid", BigInteger, nullable=False),
+)
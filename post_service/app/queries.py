@@ -0,0 +1,280 @@
+import base64
+from datetime import datetime
+from sqlalchemy import (
+    select, insert, update, delete, func, desc, or_, and_, tuple_, any_, literal, literal_column, cast,
+    union_all, Integer, BigInteger, String, Float, Text
+)
+from sqlalchemy.dialects.postgresql import ARRAY
+
+from app import models
+
+# SQL statements shared by the threaded and the asyncio servicers, so both
+# server modes run exactly the same queries
+
+posts_table = models.Post.__table__
+# Every column but the search vector, for RETURNING clauses
+post_columns = [column for column in posts_table.c if column is not posts_table.c.search_vector]
+
+# Must match the configuration search_vector is built with
+SEARCH_CONFIG = literal_column("'english'::regconfig")
+
+def visible_to(user_id):
+    if user_id:
+        return or_(
+            models.Post.is_private == False,
+            models.Post.creator_id == user_id
+        )
+    return models.Post.is_private == False
+
+# The same visibility as disjoint branches: public posts, and the viewer's
+# other posts. Each branch matches one of the list indexes (see
+# migrations/versions/0002_list_indexes.py), where the OR above cannot use
+# either of them.
+def visible_branches(user_id):
+    branches = [~models.Post.is_private]
+    if user_id:
+        branches.append(and_(
+            models.Post.creator_id == user_id,
+            models.Post.is_private.isnot(False)
+        ))
+    return branches
+
+# Posts carrying any (&&) or all (@>) of the given tags; both operators are
+# served by the GIN index on posts.tags. The cast keeps the parameter the
+# same type as the column, which the index needs.
+def tagged(tags, match_all=False):
+    value = cast(literal(list(tags), ARRAY(String)), ARRAY(String))
+    if match_all:
+        return models.Post.tags.contains(value)
+    return models.Post.tags.overlap(value)
+
+# Reads select plain columns and return Core rows: the servicers only copy
+# them into messages, so ORM objects and the identity map are pure overhead
+
+# Columns for the given post fields plus the ones a statement needs itself,
+# in table order. Reads given fields=None select every column.
+def post_columns_for(fields, required=()):
+    if fields is None:
+        return post_columns
+    names = set(fields).union(required)
+    return [column for column in post_columns if column.name in names]
+
+# The access check needs creator_id and is_private whatever else is read
+def get_post_statement(post_id, fields=None):
+    columns = post_columns_for(fields, ("id", "creator_id", "is_private"))
+    return select(*columns).where(posts_table.c.id == post_id)
+
+# ids travel as a single array parameter: WHERE id = ANY(:ids)
+def batch_get_posts_statement(post_ids):
+    return select(*post_columns).where(posts_table.c.id == any_(literal(post_ids, ARRAY(Integer))))
+
+def post_exists_statement(post_id):
+    return select(posts_table.c.id).where(posts_table.c.id == post_id)
+
+# Writes are single statements returning the affected row. Update and delete
+# match on both id and creator, so no row back means "missing or not yours";
+# callers tell the two apart with post_exists_statement on that path only.
+
+def insert_post_statement(title, description, creator_id, is_private, tags):
+    return insert(posts_table).values(
+        title=title,
+        description=description,
+        creator_id=creator_id,
+        is_private=is_private,
+        tags=tags,
+        created_at=func.now(),
+        updated_at=func.now()
+    ).returning(*post_columns)
+
+# Executed with a list of rows: SQLAlchemy's insertmanyvalues sends them as
+# multi-row INSERT ... VALUES (...), (...) RETURNING id pages. PostgreSQL does
+# not promise RETURNING in VALUES order, so sort_by_parameter_order has
+# SQLAlchemy correlate the ids back to the rows they were given in.
+# created_at/updated_at come from the server defaults.
+def insert_posts_statement():
+    return insert(posts_table).returning(posts_table.c.id, sort_by_parameter_order=True)
+
+def update_post_statement(post_id, user_id, values):
+    return update(posts_table) \
+        .where(posts_table.c.id == post_id, posts_table.c.creator_id == user_id) \
+        .values(**values, updated_at=func.now()) \
+        .returning(*post_columns)
+
+def delete_post_statement(post_id, user_id):
+    return delete(posts_table) \
+        .where(posts_table.c.id == post_id, posts_table.c.creator_id == user_id) \
+        .returning(posts_table.c.id)
+
+def count_posts_statement(user_id, tags=None, match_all=False):
+    total = None
+    for condition in visible_branches(user_id):
+        count = select(func.count()).select_from(models.Post).where(condition)
+        if tags:
+            count = count.where(tagged(tags, match_all))
+        count = count.scalar_subquery()
+        total = count if total is None else total + count
+    return select(total)
+
+def newest_first(columns):
+    return desc(columns.created_at), desc(columns.id)
+
+# Fetches one row more than page_size so the caller can tell whether a next
+# page exists. Each visibility branch is read newest first off its index and
+# cut at the deepest row the page can reach; the branches are then merged.
+# `fields` narrows the rows to what the caller needs; id and created_at are
+# always read for ordering and the cursor.
+def list_posts_statement(user_id, page_size, page=1, cursor=None, tags=None, match_all=False,
+                         fields=None):
+    offset = 0 if cursor is not None else (page - 1) * page_size
+    limit = page_size + 1
+    columns = post_columns_for(fields, ("id", "created_at"))
+
+    branches = []
+    for condition in visible_branches(user_id):
+        branch = select(*columns).where(condition)
+        if tags:
+            branch = branch.where(tagged(tags, match_all))
+        if cursor is not None:
+            branch = branch.where(tuple_(models.Post.created_at, models.Post.id) < cursor)
+        branches.append(branch.order_by(*newest_first(models.Post)).limit(offset + limit))
+
+    if len(branches) == 1:
+        return branches[0].offset(offset).limit(limit)
+
+    merged = union_all(*branches).subquery()
+    return select(*merged.c).order_by(*newest_first(merged.c)).offset(offset).limit(limit)
+
+# Most used tags among the posts the viewer can see, optionally narrowed to
+# posts matching a tag filter. Rows are (tag, count).
+def tag_facets_statement(user_id, limit, tags=None, match_all=False):
+    tag = func.unnest(models.Post.tags).column_valued("tag")
+    count = func.count().label("count")
+
+    statement = select(tag, count).select_from(models.Post).where(visible_to(user_id))
+    if tags:
+        statement = statement.where(tagged(tags, match_all))
+
+    return statement.group_by(tag).order_by(desc(count), tag).limit(limit)
+
+# Export order is by primary key so the scan can stream straight off the index
+def stream_posts_statement(user_id, creator_id=0):
+    statement = select(*post_columns).where(visible_to(user_id))
+    if creator_id:
+        statement = statement.where(models.Post.creator_id == creator_id)
+    return statement.order_by(models.Post.id)
+
+# Ranked full-text search. websearch_to_tsquery accepts what users type into
+# a search box ("quoted phrases", or, -excluded) and never fails to parse.
+# Ranking reads every candidate's vector, so only the newest max_ranked
+# matches are candidates: selective queries come straight off the GIN index,
+# broad ones walk the primary key backwards and stop early.
+# Rows are the post columns plus rank, best first, with one extra row for the
+# next page.
+def search_posts_statement(user_id, text, page_size, max_ranked, cursor=None):
+    query = func.websearch_to_tsquery(SEARCH_CONFIG, text)
+
+    # float8 so the rank round-trips through the cursor unchanged
+    rank = cast(func.ts_rank(models.Post.search_vector, query), Float).label("rank")
+
+    # One match past max_ranked is read to tell whether older ones were left
+    # out; it is dropped again before ranking
+    candidates = select(*post_columns, rank) \
+        .where(models.Post.search_vector.bool_op("@@")(query), visible_to(user_id)) \
+        .order_by(desc(models.Post.id)) \
+        .limit(max_ranked + 1) \
+        .subquery()
+
+    windowed = select(
+        candidates,
+        func.row_number().over(order_by=desc(candidates.c.id)).label("recency"),
+        (func.count().over() > max_ranked).label("truncated")
+    ).subquery()
+
+    statement = select(*(column for column in windowed.c if column.name != "recency")) \
+        .where(windowed.c.recency <= max_ranked)
+    if cursor is not None:
+        statement = statement.where(tuple_(windowed.c.rank, windowed.c.id) < cursor)
+
+    return statement.order_by(desc(windowed.c.rank), desc(windowed.c.id)).limit(page_size + 1)
+
+# Change feed {
+post_events_table = models.PostEvent.__table__
+horizon_table = models.post_events_horizon
+
+# Every transaction below this id has finished, so no event with a smaller
+# xid can still appear
+def snapshot_xmin():
+    return cast(cast(func.pg_snapshot_xmin(func.pg_current_snapshot()), Text), BigInteger)
+
+def snapshot_xmin_statement():
+    return select(snapshot_xmin())
+
+def post_events_statement(after_xid, after_seq, limit):
+    events = post_events_table.c
+    return select(post_events_table) \
+        .where(tuple_(events.xid, events.seq) > tuple_(after_xid, after_seq)) \
+        .where(events.xid < snapshot_xmin()) \
+        .order_by(events.xid, events.seq) \
+        .limit(limit)
+
+def pruned_xid_statement():
+    return select(horizon_table.c.pruned_xid)
+
+# Deletes up to `limit` events older than `before`, moves the horizon past
+# them and returns how many were deleted. Bounded so each run stays well
+# within the statement timeout however far behind pruning is.
+def prune_post_events_statement(before, limit):
+    expired = select(post_events_table.c.seq) \
+        .where(post_events_table.c.occurred_at < before) \
+        .order_by(post_events_table.c.occurred_at) \
+        .limit(limit) \
+        .with_for_update(skip_locked=True)
+    deleted = delete(post_events_table) \
+        .where(post_events_table.c.seq.in_(expired.scalar_subquery())) \
+        .returning(post_events_table.c.xid) \
+        .cte("deleted")
+    newest_deleted = select(func.coalesce(func.max(deleted.c.xid), 0)).scalar_subquery()
+    deleted_count = select(func.count()).select_from(deleted).scalar_subquery()
+    return update(horizon_table) \
+        .values(pruned_xid=func.greatest(horizon_table.c.pruned_xid, newest_deleted)) \
+        .returning(deleted_count) \
+        .add_cte(deleted)
+# }
+
+# Keyset cursors are opaque to clients: base64 of "<created_at>|<id>" of the
+# last post on the previous page
+def encode_cursor(post):
+    raw = f"{post.created_at.isoformat()}|{post.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def decode_cursor(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode()).decode()
+        created_at, post_id = raw.rsplit("|", 1)
+        return datetime.fromisoformat(created_at), int(post_id)
+    except (ValueError, UnicodeError) as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
+# Search cursors hold "<rank>|<id>" of the last hit instead
+def encode_search_cursor(rank, post_id):
+    return base64.urlsafe_b64encode(f"{rank!r}|{post_id}".encode()).decode()
+
+def decode_search_cursor(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode()).decode()
+        rank, post_id = raw.rsplit("|", 1)
+        return float(rank), int(post_id)
+    except (ValueError, UnicodeError) as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
+# Change feed positions hold "<xid>|<seq>" of the last event delivered
+def encode_event_token(xid, seq):
+    return base64.urlsafe_b64encode(f"{xid}|{seq}".encode()).decode()
+
+def decode_event_token(token):
+    try:
+        raw = base64.urlsafe_b64decode(token.encode()).decode()
+        xid, seq = raw.split("|")
+        return int(xid), int(seq)
+    except (ValueError, UnicodeError) as e:
+        raise ValueError(f"Invalid resume token: {token}") from e
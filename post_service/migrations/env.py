@@ -0,0 +1,45 @@
+from alembic import context
+from sqlalchemy import create_engine, text
+from sqlalchemy.pool import NullPool
+
+from app import database, models  # noqa: F401  models registers the tables on Base
+
+# Arbitrary key for pg_advisory_lock: replicas starting together take turns
+# instead of racing to apply the same revision
+MIGRATION_LOCK_KEY = 5051
+
+
+def run_migrations_offline():
+    context.configure(
+        url=database.SQLALCHEMY_DATABASE_URL,
+        target_metadata=database.Base.metadata,
+        literal_binds=True,
+    )
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def run_migrations_online():
+    # Not database.engine: its statement_timeout would cancel index builds,
+    # table rewrites and the wait for the lock on any sizeable table
+    engine = create_engine(database.SQLALCHEMY_DATABASE_URL, poolclass=NullPool)
+    with engine.connect() as connection:
+        connection.execute(text("SELECT pg_advisory_lock(:key)"), {"key": MIGRATION_LOCK_KEY})
+        connection.commit()
+        try:
+            context.configure(
+                connection=connection,
+                target_metadata=database.Base.metadata,
+                transaction_per_migration=True,
+            )
+            with context.begin_transaction():
+                context.run_migrations()
+        finally:
+            connection.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": MIGRATION_LOCK_KEY})
+            connection.commit()
+
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    run_migrations_online()
@@ -0,0 +1,35 @@
+"""create posts
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-17
+
+The table as Base.metadata.create_all used to build it. IF NOT EXISTS lets
+databases created that way be adopted without changes.
+"""
+from alembic import op
+
+revision = "0001"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute("""
+        CREATE TABLE IF NOT EXISTS posts (
+            id SERIAL PRIMARY KEY,
+            title VARCHAR(255) NOT NULL,
+            description VARCHAR NOT NULL,
+            creator_id INTEGER NOT NULL,
+            created_at TIMESTAMP WITH TIME ZONE DEFAULT now(),
+            updated_at TIMESTAMP WITH TIME ZONE DEFAULT now(),
+            is_private BOOLEAN,
+            tags VARCHAR[]
+        )
+    """)
+    op.execute("CREATE INDEX IF NOT EXISTS ix_posts_id ON posts (id)")
+
+
+def downgrade():
+    op.execute("DROP TABLE posts")
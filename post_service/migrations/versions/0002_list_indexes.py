@@ -0,0 +1,39 @@
+"""indexes for the ListPosts access paths
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-17
+
+ListPosts reads two branches, both ordered by (created_at DESC, id DESC):
+public posts, and the viewer's own posts. Each gets an index in that order
+so a page is an index range scan that stops after LIMIT rows instead of a
+sequential scan plus sort. ix_posts_id duplicated the primary key index.
+
+Indexes are built CONCURRENTLY so existing tables stay writable meanwhile.
+"""
+from alembic import op
+
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.get_context().autocommit_block():
+        op.execute(
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_posts_public_created "
+            "ON posts (created_at DESC, id DESC) WHERE NOT is_private"
+        )
+        op.execute(
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_posts_creator_created "
+            "ON posts (creator_id, created_at DESC, id DESC)"
+        )
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS ix_posts_id")
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.execute("CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_posts_id ON posts (id)")
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS ix_posts_creator_created")
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS ix_posts_public_created")
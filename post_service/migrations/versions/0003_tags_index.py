@@ -0,0 +1,25 @@
+"""GIN index on posts.tags
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-17
+
+Serves the tag filters of ListPosts and GetTagFacets (tags && :tags for any,
+tags @> :tags for all).
+"""
+from alembic import op
+
+revision = "0003"
+down_revision = "0002"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.get_context().autocommit_block():
+        op.execute("CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_posts_tags ON posts USING gin (tags)")
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS ix_posts_tags")
@@ -0,0 +1,90 @@
+"""post_events outbox for WatchPosts
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-17
+
+Statement-level triggers on posts record one row per written post in
+post_events, in the same transaction as the write, and wake listeners with
+NOTIFY post_events (delivered on commit, once per transaction).
+
+xid is the writing transaction. Readers only take events of transactions
+older than their snapshot's xmin, which have all finished, in (xid, seq)
+order; seq alone can commit out of order and be skipped.
+
+post_events_horizon holds the newest xid removed by pruning, so a consumer
+resuming from before it can be told it missed events.
+"""
+from alembic import op
+
+revision = "0005"
+down_revision = "0004"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute("""
+        CREATE TABLE post_events (
+            seq BIGSERIAL PRIMARY KEY,
+            xid BIGINT NOT NULL DEFAULT pg_current_xact_id()::text::bigint,
+            event_type VARCHAR(16) NOT NULL,
+            post_id INTEGER NOT NULL,
+            creator_id INTEGER NOT NULL,
+            updated_at TIMESTAMP WITH TIME ZONE,
+            occurred_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now()
+        )
+    """)
+    op.execute("CREATE INDEX ix_post_events_xid_seq ON post_events (xid, seq)")
+    op.execute("CREATE INDEX ix_post_events_occurred_at ON post_events (occurred_at)")
+
+    op.execute("""
+        CREATE TABLE post_events_horizon (
+            id BOOLEAN PRIMARY KEY DEFAULT true CHECK (id),
+            pruned_xid BIGINT NOT NULL DEFAULT 0
+        )
+    """)
+    op.execute("INSERT INTO post_events_horizon DEFAULT VALUES")
+
+    op.execute("""
+        CREATE FUNCTION record_post_events() RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP = 'DELETE' THEN
+                INSERT INTO post_events (event_type, post_id, creator_id, updated_at)
+                SELECT 'deleted', id, creator_id, updated_at FROM old_posts;
+            ELSE
+                INSERT INTO post_events (event_type, post_id, creator_id, updated_at)
+                SELECT CASE TG_OP WHEN 'INSERT' THEN 'created' ELSE 'updated' END,
+                       id, creator_id, updated_at
+                FROM new_posts;
+            END IF;
+            PERFORM pg_notify('post_events', '');
+            RETURN NULL;
+        END
+        $$ LANGUAGE plpgsql
+    """)
+    # Transition tables allow only one event per trigger
+    op.execute("""
+        CREATE TRIGGER posts_insert_events AFTER INSERT ON posts
+        REFERENCING NEW TABLE AS new_posts
+        FOR EACH STATEMENT EXECUTE FUNCTION record_post_events()
+    """)
+    op.execute("""
+        CREATE TRIGGER posts_update_events AFTER UPDATE ON posts
+        REFERENCING NEW TABLE AS new_posts
+        FOR EACH STATEMENT EXECUTE FUNCTION record_post_events()
+    """)
+    op.execute("""
+        CREATE TRIGGER posts_delete_events AFTER DELETE ON posts
+        REFERENCING OLD TABLE AS old_posts
+        FOR EACH STATEMENT EXECUTE FUNCTION record_post_events()
+    """)
+
+
+def downgrade():
+    op.execute("DROP TRIGGER posts_delete_events ON posts")
+    op.execute("DROP TRIGGER posts_update_events ON posts")
+    op.execute("DROP TRIGGER posts_insert_events ON posts")
+    op.execute("DROP FUNCTION record_post_events()")
+    op.execute("DROP TABLE post_events_horizon")
+    op.execute("DROP TABLE post_events")
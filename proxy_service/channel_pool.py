@@ -0,0 +1,124 @@
+import contextlib
+import itertools
+import json
+import time
+
+import grpc
+
+import post_pb2
+import post_pb2_grpc
+
+# Channels to every post_service target, several per target so concurrent
+# calls are not all multiplexed over one HTTP/2 connection. Each channel
+# balances round_robin over every address its target resolves to, so a
+# dns:/// target spreads over all replicas behind the name. Addresses are
+# health checked (grpc.health.v1) and skipped while not SERVING, which is
+# what takes a single failing replica out.
+#
+# Calls go to the channel with the fewest calls in flight. A target whose
+# calls keep failing with unhealthy codes is ejected for a while, all of its
+# channels at once; this only helps with several targets, e.g. one per host.
+# If every target is ejected they are all used again rather than failing
+# outright.
+
+POST_SERVICE_NAME = post_pb2.DESCRIPTOR.services_by_name["PostService"].full_name
+
+SERVICE_CONFIG = json.dumps({
+    "loadBalancingConfig": [{"round_robin": {}}],
+    "healthCheckConfig": {"serviceName": POST_SERVICE_NAME},
+})
+
+def channel_options(keepalive_time_ms, keepalive_timeout_ms):
+    return [
+        ("grpc.service_config", SERVICE_CONFIG),
+        # Channels with the same target and arguments would otherwise share
+        # connections through the global subchannel pool
+        ("grpc.use_local_subchannel_pool", 1),
+        ("grpc.keepalive_time_ms", keepalive_time_ms),
+        ("grpc.keepalive_timeout_ms", keepalive_timeout_ms),
+        ("grpc.keepalive_permit_without_calls", 1),
+        ("grpc.http2.max_pings_without_data", 0),
+    ]
+
+# Failure tracking shared by the channels of one target
+class Target:
+    def __init__(self, name):
+        self.name = name
+        self.failures = 0
+        self.ejections = 0
+        self.ejected_until = 0.0
+
+class Endpoint:
+    def __init__(self, target, channel):
+        self.target = target
+        self.channel = channel
+        self.stub = post_pb2_grpc.PostServiceStub(channel)
+        self.in_flight = 0
+        self.calls = 0
+
+    def available(self, now):
+        if self.target.ejected_until > now:
+            return False
+        return self.channel.get_state() != grpc.ChannelConnectivity.TRANSIENT_FAILURE
+
+    # Counts a call (or stream) as in flight while the block runs
+    @contextlib.contextmanager
+    def busy(self):
+        self.in_flight += 1
+        self.calls += 1
+        try:
+            yield self.stub
+        finally:
+            self.in_flight -= 1
+
+class ChannelPool:
+    def __init__(self, targets, channels_per_target=2, eject_after=3, eject_time=10.0,
+                 keepalive_time_ms=30000, keepalive_timeout_ms=10000, compression=None):
+        self.eject_after = eject_after
+        self.eject_time = eject_time
+        options = channel_options(keepalive_time_ms, keepalive_timeout_ms)
+        self.endpoints = [
+            Endpoint(target, grpc.aio.insecure_channel(target.name, options=options, compression=compression))
+            for target in map(Target, targets)
+            for _ in range(channels_per_target)
+        ]
+        self._rotation = itertools.count()
+
+    async def close(self):
+        for endpoint in self.endpoints:
+            await endpoint.channel.close()
+
+    # Least loaded endpoint; the rotating start breaks ties, so idle
+    # endpoints take turns. `avoid` is skipped when there is a choice, so a
+    # retry goes somewhere else.
+    def pick(self, avoid=None):
+        now = time.monotonic()
+        available = [endpoint for endpoint in self.endpoints if endpoint.available(now)]
+        candidates = [endpoint for endpoint in available if endpoint is not avoid] or available or self.endpoints
+
+        start = next(self._rotation) % len(candidates)
+        return min(candidates[start:] + candidates[:start], key=lambda endpoint: endpoint.in_flight)
+
+    def record_success(self, endpoint):
+        endpoint.target.failures = 0
+
+    def record_failure(self, endpoint):
+        target = endpoint.target
+        target.failures += 1
+        if target.failures >= self.eject_after:
+            target.failures = 0
+            target.ejections += 1
+            target.ejected_until = time.monotonic() + self.eject_time
+
+    def stats(self):
+        now = time.monotonic()
+        return [
+            {
+                "target": endpoint.target.name,
+                "in_flight": endpoint.in_flight,
+                "calls": endpoint.calls,
+                "ejections": endpoint.target.ejections,
+                "ejected": endpoint.target.ejected_until > now,
+            }
+            for endpoint in self.endpoints
+        ]
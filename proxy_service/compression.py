@@ -0,0 +1,140 @@
+import zlib
+
+from starlette.datastructures import Headers, MutableHeaders
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Response compression negotiated by Accept-Encoding. Bodies below
+# minimum_size go out as they are: compressing them costs more CPU than the
+# bytes saved are worth. Streamed responses (e.g. NDJSON export) are
+# compressed chunk by chunk, each chunk flushed so clients still get it at
+# once. Brotli is offered only when the brotli package is installed.
+
+class GzipEncoder:
+    def __init__(self, level):
+        # wbits 16 + MAX_WBITS writes the gzip header and trailer
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def compress(self, data):
+        return self._compressor.compress(data)
+
+    def flush(self):
+        return self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        return self._compressor.flush()
+
+class BrotliEncoder:
+    def __init__(self, quality):
+        self._compressor = brotli.Compressor(quality=quality)
+
+    def compress(self, data):
+        return self._compressor.process(data)
+
+    def flush(self):
+        return self._compressor.flush()
+
+    def finish(self):
+        return self._compressor.finish()
+
+# The first of `available` the client accepts, None for identity. Client
+# q-values only rule encodings in or out (q=0); the server's order decides.
+def negotiate_encoding(accept_encoding, available):
+    accepted = {}
+    for item in accept_encoding.split(","):
+        name, _, params = item.partition(";")
+        quality = 1.0
+        for param in params.split(";"):
+            key, _, value = param.partition("=")
+            if key.strip().lower() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        accepted[name.strip().lower()] = quality
+
+    for encoding in available:
+        if accepted.get(encoding, accepted.get("*", 0.0)) > 0:
+            return encoding
+    return None
+
+class CompressionMiddleware:
+    def __init__(self, app, encodings=("br", "gzip"), minimum_size=1024, gzip_level=1, brotli_quality=1):
+        self.app = app
+        self.minimum_size = minimum_size
+        encoders = {
+            "br": (lambda: BrotliEncoder(brotli_quality)) if brotli is not None else None,
+            "gzip": lambda: GzipEncoder(gzip_level),
+        }
+        self.encoders = {encoding: encoders[encoding] for encoding in encodings if encoders.get(encoding)}
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.encoders:
+            await self.app(scope, receive, send)
+            return
+
+        encoding = negotiate_encoding(Headers(scope=scope).get("accept-encoding", ""), self.encoders)
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        await self.app(scope, receive, CompressingSend(send, encoding, self.encoders[encoding], self.minimum_size))
+
+# Holds back the response start until the first body message shows whether
+# the response is worth compressing
+class CompressingSend:
+    def __init__(self, send, encoding, make_encoder, minimum_size):
+        self.send = send
+        self.encoding = encoding
+        self.make_encoder = make_encoder
+        self.minimum_size = minimum_size
+        self.start = None
+        self.encoder = None
+
+    async def __call__(self, message):
+        if message["type"] == "http.response.start":
+            self.start = message
+            return
+        if message["type"] != "http.response.body" or (self.start is None and self.encoder is None):
+            await self.send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+
+        if self.start is not None:
+            start, self.start = self.start, None
+            headers = MutableHeaders(raw=start["headers"])
+            if "content-encoding" in headers or (not more_body and (not body or len(body) < self.minimum_size)):
+                await self.send(start)
+                await self.send(message)
+                return
+
+            self.encoder = self.make_encoder()
+            body = self._encode(body, more_body)
+
+            headers["Content-Encoding"] = self.encoding
+            vary = headers.get("vary")
+            headers["Vary"] = f"{vary}, Accept-Encoding" if vary else "Accept-Encoding"
+            # The compressed bytes differ from the identity ones, so the
+            # validator is only weak; If-None-Match compares weakly anyway
+            etag = headers.get("etag")
+            if etag and not etag.startswith("W/"):
+                headers["ETag"] = f"W/{etag}"
+            if more_body:
+                del headers["Content-Length"]
+            else:
+                headers["Content-Length"] = str(len(body))
+            await self.send(start)
+        else:
+            body = self._encode(body, more_body)
+
+        await self.send({"type": "http.response.body", "body": body, "more_body": more_body})
+
+    def _encode(self, body, more_body):
+        if more_body:
+            return self.encoder.compress(body) + self.encoder.flush()
+        return self.encoder.compress(body) + self.encoder.finish()
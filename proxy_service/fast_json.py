@@ -0,0 +1,18 @@
+import orjson
+from fastapi.responses import JSONResponse
+
+# JSON responses encoded by orjson. Datetimes come out in the same ISO 8601
+# form FastAPI's own encoder uses.
+class FastJSONResponse(JSONResponse):
+    def render(self, content):
+        return orjson.dumps(content)
+
+# Post dicts from grpc_client are built in the shape of the response models
+# already. Read endpoints hand them over through this instead of returning
+# them, which skips FastAPI's validation against response_model and its
+# jsonable_encoder pass; response_model still documents the schema.
+def json_response(content, status_code=200, headers=None):
+    return FastJSONResponse(content, status_code=status_code, headers=headers)
+
+def ndjson_line(content):
+    return orjson.dumps(content) + b"\n"
@@ -1,142 +1,641 @@
+import asyncio
 import grpc
+import os
 from datetime import datetime
 from google.protobuf.timestamp_pb2 import Timestamp
+from google.protobuf.empty_pb2 import Empty
 
 import post_pb2
 import post_pb2_grpc
+from channel_pool import ChannelPool
+from singleflight import SingleFlight
+from resilience import (
+    RetryBudget, CircuitBreaker, call_timeout, backoff_delay, request_deadline, remaining_time
+)
 
-# gRPC client for post service
+POST_SERVICE_HOST = os.getenv("POST_SERVICE_HOST", "post_service:50051")
+
+# Replicas {
+# Comma separated gRPC targets, e.g. "dns:///post_service:50051" to spread
+# over every address behind the name, or "host-a:50051,host-b:50051"
+POST_SERVICE_TARGETS = [
+    target.strip() for target in os.getenv("POST_SERVICE_TARGETS", POST_SERVICE_HOST).split(",") if target.strip()
+]
+POST_SERVICE_CHANNELS_PER_TARGET = int(os.getenv("POST_SERVICE_CHANNELS_PER_TARGET", "2"))
+POST_SERVICE_KEEPALIVE_TIME_MS = int(os.getenv("POST_SERVICE_KEEPALIVE_TIME_MS", "30000"))
+POST_SERVICE_KEEPALIVE_TIMEOUT_MS = int(os.getenv("POST_SERVICE_KEEPALIVE_TIMEOUT_MS", "10000"))
+# A target failing this many calls in a row is skipped for EJECT_TIME seconds.
+# Replicas behind one target are taken out by health checks instead.
+EJECT_AFTER_FAILURES = int(os.getenv("EJECT_AFTER_FAILURES", "3"))
+EJECT_TIME = float(os.getenv("EJECT_TIME", "10"))
+# }
+
+# Message compression {
+# Algorithm for messages sent to post_service: "none", "gzip" or "deflate".
+# Only BulkCreatePosts sends much; answers are compressed as post_service's
+# GRPC_COMPRESSION says, which this client always accepts.
+COMPRESSION_ALGORITHMS = {
+    "none": grpc.Compression.NoCompression,
+    "gzip": grpc.Compression.Gzip,
+    "deflate": grpc.Compression.Deflate,
+}
+POST_SERVICE_COMPRESSION = COMPRESSION_ALGORITHMS[os.getenv("POST_SERVICE_COMPRESSION", "none")]
+# }
+
+# Posts per BulkCreatePosts stream message
+BULK_CREATE_CHUNK_SIZE = int(os.getenv("BULK_CREATE_CHUNK_SIZE", "500"))
+
+# Call limits {
+# Per-attempt timeouts by method, in seconds; each is also cut to what is
+# left of the proxy request's own deadline (see resilience.py)
+POST_SERVICE_READ_TIMEOUT = float(os.getenv("POST_SERVICE_READ_TIMEOUT", "2"))
+POST_SERVICE_WRITE_TIMEOUT = float(os.getenv("POST_SERVICE_WRITE_TIMEOUT", "5"))
+POST_SERVICE_BULK_TIMEOUT = float(os.getenv("POST_SERVICE_BULK_TIMEOUT", "30"))
+METHOD_TIMEOUTS = {
+    "GetPost": POST_SERVICE_READ_TIMEOUT,
+    "ListPosts": POST_SERVICE_READ_TIMEOUT,
+    "BatchGetPosts": POST_SERVICE_READ_TIMEOUT,
+    "SearchPosts": POST_SERVICE_READ_TIMEOUT,
+    "GetTagFacets": POST_SERVICE_READ_TIMEOUT,
+    "GetStats": POST_SERVICE_READ_TIMEOUT,
+    "CreatePost": POST_SERVICE_WRITE_TIMEOUT,
+    "UpdatePost": POST_SERVICE_WRITE_TIMEOUT,
+    "DeletePost": POST_SERVICE_WRITE_TIMEOUT,
+    "BulkCreatePosts": POST_SERVICE_BULK_TIMEOUT,
+}
+
+# Reads are retried; writes are not, a lost answer may hide a committed write
+IDEMPOTENT_METHODS = {"GetPost", "ListPosts", "BatchGetPosts", "SearchPosts", "GetTagFacets", "GetStats"}
+POST_SERVICE_RETRIES = int(os.getenv("POST_SERVICE_RETRIES", "2"))
+RETRY_BASE_DELAY = float(os.getenv("RETRY_BASE_DELAY", "0.05"))
+RETRY_MAX_DELAY = float(os.getenv("RETRY_MAX_DELAY", "1"))
+
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "5"))
+CIRCUIT_RESET_TIMEOUT = float(os.getenv("CIRCUIT_RESET_TIMEOUT", "10"))
+# }
+
+# Codes worth another attempt, and codes that say post_service itself is
+# unhealthy rather than the request being wrong
+RETRYABLE_CODES = {grpc.StatusCode.UNAVAILABLE}
+UNHEALTHY_CODES = {
+    grpc.StatusCode.UNAVAILABLE,
+    grpc.StatusCode.DEADLINE_EXCEEDED,
+    grpc.StatusCode.RESOURCE_EXHAUSTED,
+    grpc.StatusCode.INTERNAL,
+    grpc.StatusCode.UNKNOWN,
+}
+
+COUNT_MODES = {
+    "exact": post_pb2.COUNT_EXACT,
+    "cached": post_pb2.COUNT_CACHED,
+    "none": post_pb2.COUNT_NONE,
+}
+
+TAG_MATCHES = {
+    "any": post_pb2.TAG_MATCH_ANY,
+    "all": post_pb2.TAG_MATCH_ALL,
+}
+
+EVENT_TYPES = {
+    post_pb2.POST_CREATED: "created",
+    post_pb2.POST_UPDATED: "updated",
+    post_pb2.POST_DELETED: "deleted",
+}
+
+# Post fields in message order. Methods taking `fields` send them as the
+# read mask and return post dicts with just those keys; None reads every
+# field.
+POST_FIELDS = ("id", "title", "description", "creator_id", "created_at", "updated_at", "is_private", "tags")
+# What get_post checks access with when merging calls
+ACCESS_FIELDS = ("creator_id", "is_private")
+
+# Union of field selections in message order; None (every field) wins
+def union_fields(*selections):
+    if any(fields is None for fields in selections):
+        return None
+    wanted = set().union(*selections)
+    return tuple(field for field in POST_FIELDS if field in wanted)
+
+def narrow_post(post, fields):
+    if fields is None:
+        return post
+    return {field: post[field] for field in fields}
+
+def timestamp_to_datetime(timestamp):
+    return datetime.fromtimestamp(timestamp.seconds + timestamp.nanos / 1e9)
+
+def post_proto_to_dict(post_proto, fields=None):
+    post = {
+        "id": post_proto.id,
+        "title": post_proto.title,
+        "description": post_proto.description,
+        "creator_id": post_proto.creator_id,
+        "created_at": timestamp_to_datetime(post_proto.created_at),
+        "updated_at": timestamp_to_datetime(post_proto.updated_at),
+        "is_private": post_proto.is_private,
+        # Slicing is cheaper than list() on a repeated field
+        "tags": post_proto.tags[:]
+    }
+    return narrow_post(post, fields)
+
+def list_response_to_dict(response, fields=None):
+    counted = response.count_mode != post_pb2.COUNT_NONE
+    return {
+        "posts": [post_proto_to_dict(post, fields) for post in response.posts],
+        "total_count": response.total_count if counted else None,
+        "page": response.page,
+        "page_size": response.page_size,
+        "total_pages": response.total_pages if counted else None,
+        "total_count_exact": response.count_mode == post_pb2.COUNT_EXACT,
+        "next_cursor": response.next_cursor or None
+    }
+
+def batch_response_to_dict(response):
+    return {
+        "posts": [post_proto_to_dict(post) for post in response.posts],
+        "not_found_ids": list(response.not_found_ids),
+        "denied_ids": list(response.denied_ids)
+    }
+
+def bulk_response_to_dict(response):
+    errors = {error.index: error.message for error in response.errors}
+    return {
+        "created_count": response.created_count,
+        "failed_count": response.failed_count,
+        "results": [
+            {"index": index, "id": post_id or None, "error": errors.get(index)}
+            for index, post_id in enumerate(response.ids)
+        ]
+    }
+
+def facets_response_to_dict(response):
+    return {
+        "facets": [{"tag": facet.tag, "count": facet.count} for facet in response.facets]
+    }
+
+def search_response_to_dict(response):
+    return {
+        "hits": [
+            {"post": post_proto_to_dict(hit.post), "rank": hit.rank}
+            for hit in response.hits
+        ],
+        "next_cursor": response.next_cursor or None,
+        "truncated": response.truncated
+    }
+
+def stats_response_to_dict(response):
+    return {
+        name: {"size": stats.size, "maxsize": stats.maxsize, "hits": stats.hits, "misses": stats.misses}
+        for name, stats in response.caches.items()
+    }
+
+def event_proto_to_dict(event):
+    return {
+        "seq": event.seq,
+        "type": EVENT_TYPES[event.type],
+        "post_id": event.post_id,
+        "creator_id": event.creator_id,
+        "updated_at": timestamp_to_datetime(event.updated_at),
+        "resume_token": event.resume_token
+    }
+
+def build_bulk_requests(posts, creator_id):
+    for start in range(0, len(posts), BULK_CREATE_CHUNK_SIZE):
+        yield post_pb2.BulkCreatePostsRequest(posts=[
+            build_create_request(creator_id=creator_id, **post)
+            for post in posts[start:start + BULK_CREATE_CHUNK_SIZE]
+        ])
+
+def build_create_request(title, description, creator_id, is_private=False, tags=None):
+    return post_pb2.CreatePostRequest(
+        title=title,
+        description=description,
+        creator_id=creator_id,
+        is_private=is_private,
+        tags=tags or []
+    )
+
+def build_update_request(post_id, user_id, title=None, description=None, is_private=None, tags=None):
+    request = post_pb2.UpdatePostRequest(
+        id=post_id,
+        user_id=user_id
+    )
+
+    if title is not None:
+        request.title = title
+    if description is not None:
+        request.description = description
+    if is_private is not None:
+        request.is_private = is_private
+    if tags is not None:
+        request.tags.extend(tags)
+
+    return request
+
+def build_list_request(page=1, page_size=10, user_id=None, cursor=None, count_mode="exact",
+                       tags=None, tag_match="any", fields=None):
+    request = post_pb2.ListPostsRequest(
+        page=page,
+        page_size=page_size,
+        count_mode=COUNT_MODES[count_mode],
+        tags=tags or [],
+        tag_match=TAG_MATCHES[tag_match]
+    )
+
+    if user_id is not None:
+        request.user_id = user_id
+    if cursor:
+        request.cursor = cursor
+    if fields is not None:
+        request.read_mask.paths.extend(fields)
+
+    return request
+
+def build_get_request(post_id, user_id, fields=None):
+    request = post_pb2.GetPostRequest(
+        id=post_id,
+        user_id=user_id
+    )
+
+    if fields is not None:
+        request.read_mask.paths.extend(fields)
+
+    return request
+
+def build_facets_request(user_id, limit=None, tags=None, tag_match="any"):
+    return post_pb2.GetTagFacetsRequest(
+        user_id=user_id,
+        limit=limit or 0,
+        tags=tags or [],
+        tag_match=TAG_MATCHES[tag_match]
+    )
+
+def build_search_request(query, user_id, page_size=10, cursor=None):
+    return post_pb2.SearchPostsRequest(
+        query=query,
+        user_id=user_id,
+        page_size=page_size,
+        cursor=cursor or ""
+    )
+
+# Errors raised by the clients, each carrying the HTTP status it maps to
+class PostServiceError(Exception):
+    status_code = 500
+
+class PostNotFound(PostServiceError):
+    status_code = 404
+
+class PermissionDenied(PostServiceError):
+    status_code = 403
+
+class InvalidArgument(PostServiceError):
+    status_code = 400
+
+# WatchPosts resume token older than the retained events
+class EventsPruned(PostServiceError):
+    status_code = 410
+
+class PostServiceUnavailable(PostServiceError):
+    status_code = 503
+
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+class PostServiceTimeout(PostServiceError):
+    status_code = 504
+
+def translate_rpc_error(e):
+    status_code = e.code()
+    details = e.details()
+
+    if status_code == grpc.StatusCode.NOT_FOUND:
+        return PostNotFound(f"Post not found: {details}")
+    elif status_code == grpc.StatusCode.PERMISSION_DENIED:
+        return PermissionDenied(f"Permission denied: {details}")
+    elif status_code == grpc.StatusCode.INVALID_ARGUMENT:
+        return InvalidArgument(f"Invalid argument: {details}")
+    elif status_code == grpc.StatusCode.OUT_OF_RANGE:
+        return EventsPruned(f"Events pruned: {details}")
+    elif status_code == grpc.StatusCode.UNAVAILABLE:
+        return PostServiceUnavailable(f"Post service unavailable: {details}")
+    elif status_code == grpc.StatusCode.DEADLINE_EXCEEDED:
+        return PostServiceTimeout(f"Post service timed out: {details}")
+    else:
+        return PostServiceError(f"gRPC error: {status_code}, {details}")
+
+# Asyncio gRPC client for post service, used by the FastAPI handlers.
+# The channel is bound to the running event loop, so it is opened from the
+# application startup hook rather than at import time.
 class PostServiceClient:
-    def __init__(self, host="post_service:50051"):
-        self.channel = grpc.insecure_channel(host)
-        self.stub = post_pb2_grpc.PostServiceStub(self.channel)
-    
-    def timestamp_to_datetime(self, timestamp):
-        return datetime.fromtimestamp(timestamp.seconds + timestamp.nanos / 1e9)
-    
-    def post_proto_to_dict(self, post_proto):
+    def __init__(self, targets=None):
+        self.targets = targets or POST_SERVICE_TARGETS
+        self.pool = None
+        self.flights = SingleFlight()
+        self.retry_budget = RetryBudget()
+        self.breaker = CircuitBreaker(
+            failure_threshold=CIRCUIT_FAILURE_THRESHOLD,
+            reset_timeout=CIRCUIT_RESET_TIMEOUT
+        )
+
+    async def connect(self):
+        if self.pool is None:
+            self.pool = ChannelPool(
+                self.targets,
+                channels_per_target=POST_SERVICE_CHANNELS_PER_TARGET,
+                eject_after=EJECT_AFTER_FAILURES,
+                eject_time=EJECT_TIME,
+                keepalive_time_ms=POST_SERVICE_KEEPALIVE_TIME_MS,
+                keepalive_timeout_ms=POST_SERVICE_KEEPALIVE_TIMEOUT_MS,
+                compression=POST_SERVICE_COMPRESSION
+            )
+
+    async def close(self):
+        if self.pool is not None:
+            await self.pool.close()
+            self.pool = None
+
+    # Unary calls go through here: each attempt gets a deadline, fails fast
+    # while the circuit is open, and idempotent methods are retried on
+    # UNAVAILABLE, on another channel, while the retry budget and the
+    # deadline allow
+    async def _call(self, method, request):
+        limit = METHOD_TIMEOUTS[method]
+        retries = POST_SERVICE_RETRIES if method in IDEMPOTENT_METHODS else 0
+        attempt = 0
+        endpoint = None
+
+        while True:
+            timeout = call_timeout(limit)
+            if timeout <= 0:
+                raise PostServiceTimeout(f"Post service timed out: no time left for {method}")
+            if not self.breaker.allow():
+                raise PostServiceUnavailable(
+                    "Post service unavailable: circuit open",
+                    retry_after=self.breaker.retry_after()
+                )
+
+            endpoint = self.pool.pick(avoid=endpoint)
+            try:
+                with endpoint.busy() as stub:
+                    response = await getattr(stub, method)(request, timeout=timeout)
+                return self._succeeded(endpoint, response)
+            except grpc.RpcError as e:
+                code = e.code()
+                # Running out of the caller's shorter budget says nothing
+                # about post_service's health
+                if code in UNHEALTHY_CODES and not (code == grpc.StatusCode.DEADLINE_EXCEEDED and timeout < limit):
+                    self.breaker.record_failure()
+                    self.pool.record_failure(endpoint)
+                else:
+                    self.breaker.record_success()
+                    self.pool.record_success(endpoint)
+
+                if code not in RETRYABLE_CODES:
+                    self.retry_budget.record_success()
+                    raise translate_rpc_error(e)
+                self.retry_budget.record_failure()
+
+                delay = backoff_delay(attempt, RETRY_BASE_DELAY, RETRY_MAX_DELAY)
+                if attempt >= retries or delay >= call_timeout(limit) or not self.retry_budget.try_retry():
+                    raise translate_rpc_error(e)
+
+            attempt += 1
+            await asyncio.sleep(delay)
+
+    # Merges concurrent identical calls. The shared call runs outside the
+    # deadline of whichever request started it, bounded by the method
+    # timeouts alone; every caller waits for it only as long as its own
+    # request budget allows.
+    async def _shared(self, key, fn):
+        async def detached():
+            request_deadline.set(None)
+            return await fn()
+
+        timeout = remaining_time()
+        if timeout is not None and timeout <= 0:
+            raise PostServiceTimeout(f"Post service timed out: no time left for {key[0]}")
+        try:
+            return await self.flights.do(key, detached, timeout=timeout)
+        except asyncio.TimeoutError:
+            raise PostServiceTimeout(f"Post service timed out: no time left waiting for {key[0]}")
+
+    def _succeeded(self, endpoint, response):
+        self.breaker.record_success()
+        self.retry_budget.record_success()
+        self.pool.record_success(endpoint)
+        return response
+
+    def resilience_stats(self):
         return {
-            "id": post_proto.id,
-            "title": post_proto.title,
-            "description": post_proto.description,
-            "creator_id": post_proto.creator_id,
-            "created_at": self.timestamp_to_datetime(post_proto.created_at),
-            "updated_at": self.timestamp_to_datetime(post_proto.updated_at),
-            "is_private": post_proto.is_private,
-            "tags": list(post_proto.tags)
+            "circuit_breaker": self.breaker.stats(),
+            "retry_budget": self.retry_budget.stats(),
+            "channels": self.pool.stats() if self.pool is not None else [],
         }
-    
-    def create_post(self, title, description, creator_id, is_private=False, tags=None):
-        if tags is None:
-            tags = []
-        
-        request = post_pb2.CreatePostRequest(
-            title=title,
-            description=description,
-            creator_id=creator_id,
-            is_private=is_private,
-            tags=tags
-        )
-        
+
+    async def create_post(self, title, description, creator_id, is_private=False, tags=None):
+        request = build_create_request(title, description, creator_id, is_private, tags)
+        return post_proto_to_dict(await self._call("CreatePost", request))
+
+    # Concurrent reads of one post share a single GetPost whoever the viewers
+    # are: the post is the same for all of them, only access differs. The
+    # call is made as the first viewer, so for the others access is checked
+    # here with the server's rule.
+    async def get_post(self, post_id, user_id, fields=None):
+        read_fields = union_fields(fields, ACCESS_FIELDS)
+        led = False
+
+        async def fetch():
+            nonlocal led
+            led = True
+            return await self._get_post(post_id, user_id, read_fields)
+
         try:
-            response = self.stub.CreatePost(request)
-            return self.post_proto_to_dict(response)
-        except grpc.RpcError as e:
-            status_code = e.code()
-            details = e.details()
-            raise Exception(f"gRPC error: {status_code}, {details}")
-    
-    def get_post(self, post_id, user_id):
-        request = post_pb2.GetPostRequest(
+            post = await self._shared(("GetPost", post_id, read_fields), fetch)
+        except PermissionDenied:
+            if led:
+                raise
+            # Denied to the viewer who made the call, this one may be the creator
+            post = await self._shared(
+                ("GetPost", post_id, read_fields, user_id),
+                lambda: self._get_post(post_id, user_id, read_fields)
+            )
+            return narrow_post(post, fields)
+
+        if not led and post["is_private"] and post["creator_id"] != user_id:
+            raise PermissionDenied("Permission denied: You don't have permission to access this post")
+        return narrow_post(post, fields)
+
+    async def _get_post(self, post_id, user_id, fields=None):
+        request = build_get_request(post_id, user_id, fields)
+        return post_proto_to_dict(await self._call("GetPost", request), fields)
+
+    async def update_post(self, post_id, user_id, title=None, description=None, is_private=None, tags=None):
+        request = build_update_request(post_id, user_id, title, description, is_private, tags)
+        return post_proto_to_dict(await self._call("UpdatePost", request))
+
+    async def delete_post(self, post_id, user_id):
+        request = post_pb2.DeletePostRequest(
             id=post_id,
             user_id=user_id
         )
-        
+        await self._call("DeletePost", request)
+        return {"message": "Post deleted successfully"}
+
+    async def list_posts(self, page=1, page_size=10, user_id=None, cursor=None, count_mode="exact",
+                         tags=None, tag_match="any", fields=None):
+        request = build_list_request(page, page_size, user_id, cursor, count_mode, tags, tag_match, fields)
+        key = ("ListPosts", request.SerializeToString(deterministic=True))
+        return await self._shared(key, lambda: self._list_posts(request, fields))
+
+    async def _list_posts(self, request, fields=None):
+        return list_response_to_dict(await self._call("ListPosts", request), fields)
+
+    # Async generator of post dicts. gRPC flow control only lets the server
+    # run ahead of the consumer by a window's worth of messages. Streams run
+    # as long as the consumer reads, so they take no deadline.
+    async def stream_posts(self, user_id, creator_id=None):
+        request = post_pb2.StreamPostsRequest(
+            user_id=user_id,
+            creator_id=creator_id or 0
+        )
+
         try:
-            response = self.stub.GetPost(request)
-            return self.post_proto_to_dict(response)
+            with self.pool.pick().busy() as stub:
+                async for post in stub.StreamPosts(request):
+                    yield post_proto_to_dict(post)
         except grpc.RpcError as e:
-            status_code = e.code()
-            details = e.details()
-            
-            if status_code == grpc.StatusCode.NOT_FOUND:
-                raise Exception(f"Post not found: {details}")
-            elif status_code == grpc.StatusCode.PERMISSION_DENIED:
-                raise Exception(f"Permission denied: {details}")
-            else:
-                raise Exception(f"gRPC error: {status_code}, {details}")
-    
-    def update_post(self, post_id, user_id, title=None, description=None, is_private=None, tags=None):
-        request = post_pb2.UpdatePostRequest(
-            id=post_id,
+            raise translate_rpc_error(e)
+
+    # Async generator of post change events that never ends on its own.
+    # Pass the resume_token of the last event handled to continue after it;
+    # without one the feed starts from now.
+    async def watch_posts(self, resume_token=None):
+        request = post_pb2.WatchPostsRequest(resume_token=resume_token or "")
+
+        try:
+            with self.pool.pick().busy() as stub:
+                async for event in stub.WatchPosts(request):
+                    yield event_proto_to_dict(event)
+        except grpc.RpcError as e:
+            raise translate_rpc_error(e)
+
+    # posts are dicts with title, description, is_private and tags
+    async def bulk_create_posts(self, posts, creator_id):
+        response = await self._call("BulkCreatePosts", build_bulk_requests(posts, creator_id))
+        return bulk_response_to_dict(response)
+
+    async def batch_get_posts(self, post_ids, user_id):
+        request = post_pb2.BatchGetPostsRequest(
+            ids=post_ids,
             user_id=user_id
         )
-        
-        if title is not None:
-            request.title = title
-        if description is not None:
-            request.description = description
-        if is_private is not None:
-            request.is_private = is_private
-        if tags is not None:
-            request.tags.extend(tags)
-        
+        return batch_response_to_dict(await self._call("BatchGetPosts", request))
+
+    async def search_posts(self, query, user_id, page_size=10, cursor=None):
+        request = build_search_request(query, user_id, page_size, cursor)
+        return search_response_to_dict(await self._call("SearchPosts", request))
+
+    async def get_stats(self):
+        return stats_response_to_dict(await self._call("GetStats", Empty()))
+
+    async def get_tag_facets(self, user_id, limit=None, tags=None, tag_match="any"):
+        request = build_facets_request(user_id, limit, tags, tag_match)
+        return facets_response_to_dict(await self._call("GetTagFacets", request))
+
+# Blocking client with the same method surface, kept for scripts and tools
+# that run outside an event loop
+class SyncPostServiceClient:
+    def __init__(self, host=POST_SERVICE_HOST):
+        self.channel = grpc.insecure_channel(host, compression=POST_SERVICE_COMPRESSION)
+        self.stub = post_pb2_grpc.PostServiceStub(self.channel)
+
+    def close(self):
+        self.channel.close()
+
+    def create_post(self, title, description, creator_id, is_private=False, tags=None):
+        request = build_create_request(title, description, creator_id, is_private, tags)
+
+        try:
+            return post_proto_to_dict(self.stub.CreatePost(request))
+        except grpc.RpcError as e:
+            raise translate_rpc_error(e)
+
+    def get_post(self, post_id, user_id, fields=None):
+        request = build_get_request(post_id, user_id, fields)
+
         try:
-            response = self.stub.UpdatePost(request)
-            return self.post_proto_to_dict(response)
+            return post_proto_to_dict(self.stub.GetPost(request), fields)
         except grpc.RpcError as e:
-            status_code = e.code()
-            details = e.details()
-            
-            if status_code == grpc.StatusCode.NOT_FOUND:
-                raise Exception(f"Post not found: {details}")
-            elif status_code == grpc.StatusCode.PERMISSION_DENIED:
-                raise Exception(f"Permission denied: {details}")
-            else:
-                raise Exception(f"gRPC error: {status_code}, {details}")
-    
+            raise translate_rpc_error(e)
+
+    def update_post(self, post_id, user_id, title=None, description=None, is_private=None, tags=None):
+        request = build_update_request(post_id, user_id, title, description, is_private, tags)
+
+        try:
+            return post_proto_to_dict(self.stub.UpdatePost(request))
+        except grpc.RpcError as e:
+            raise translate_rpc_error(e)
+
     def delete_post(self, post_id, user_id):
-        request = post_pb2.DeletePostRequest(
-            id=post_id,
-            user_id=user_id
-        )
-        
+        request = post_pb2.DeletePostRequest(id=post_id, user_id=user_id)
+
         try:
             self.stub.DeletePost(request)
             return {"message": "Post deleted successfully"}
         except grpc.RpcError as e:
-            status_code = e.code()
-            details = e.details()
-            
-            if status_code == grpc.StatusCode.NOT_FOUND:
-                raise Exception(f"Post not found: {details}")
-            elif status_code == grpc.StatusCode.PERMISSION_DENIED:
-                raise Exception(f"Permission denied: {details}")
-            else:
-                raise Exception(f"gRPC error: {status_code}, {details}")
-    
-    def list_posts(self, page=1, page_size=10, user_id=None):
-        request = post_pb2.ListPostsRequest(
-            page=page,
-            page_size=page_size
-        )
-        
-        if user_id is not None:
-            request.user_id = user_id
-        
+            raise translate_rpc_error(e)
+
+    def list_posts(self, page=1, page_size=10, user_id=None, cursor=None, count_mode="exact",
+                   tags=None, tag_match="any", fields=None):
+        request = build_list_request(page, page_size, user_id, cursor, count_mode, tags, tag_match, fields)
+
+        try:
+            return list_response_to_dict(self.stub.ListPosts(request), fields)
+        except grpc.RpcError as e:
+            raise translate_rpc_error(e)
+
+    def batch_get_posts(self, post_ids, user_id):
+        request = post_pb2.BatchGetPostsRequest(ids=post_ids, user_id=user_id)
+
+        try:
+            return batch_response_to_dict(self.stub.BatchGetPosts(request))
+        except grpc.RpcError as e:
+            raise translate_rpc_error(e)
+
+    def bulk_create_posts(self, posts, creator_id):
+        try:
+            return bulk_response_to_dict(self.stub.BulkCreatePosts(build_bulk_requests(posts, creator_id)))
+        except grpc.RpcError as e:
+            raise translate_rpc_error(e)
+
+    def search_posts(self, query, user_id, page_size=10, cursor=None):
+        request = build_search_request(query, user_id, page_size, cursor)
+
+        try:
+            return search_response_to_dict(self.stub.SearchPosts(request))
+        except grpc.RpcError as e:
+            raise translate_rpc_error(e)
+
+    def get_tag_facets(self, user_id, limit=None, tags=None, tag_match="any"):
+        request = build_facets_request(user_id, limit, tags, tag_match)
+
+        try:
+            return facets_response_to_dict(self.stub.GetTagFacets(request))
+        except grpc.RpcError as e:
+            raise translate_rpc_error(e)
+
+    def get_stats(self):
+        try:
+            return stats_response_to_dict(self.stub.GetStats(Empty()))
+        except grpc.RpcError as e:
+            raise translate_rpc_error(e)
+
+    def watch_posts(self, resume_token=None):
+        request = post_pb2.WatchPostsRequest(resume_token=resume_token or "")
+
         try:
-            response = self.stub.ListPosts(request)
-            
-            posts = [self.post_proto_to_dict(post) for post in response.posts]
-            
-            return {
-                "posts": posts,
-                "total_count": response.total_count,
-                "page": response.page,
-                "page_size": response.page_size,
-                "total_pages": response.total_pages
-            }
+            for event in self.stub.WatchPosts(request):
+                yield event_proto_to_dict(event)
         except grpc.RpcError as e:
-            status_code = e.code()
-            details = e.details()
-            raise Exception(f"gRPC error: {status_code}, {details}")
+            raise translate_rpc_error(e)
@@ -0,0 +1,111 @@
+import hashlib
+import json
+import time
+
+from cache import TTLCache
+
+# ETags and the per-viewer list page cache behind GET /posts/{id} and
+# GET /posts. Every change to a post moves its updated_at, so ids plus
+# updated_at identify the representation, together with the fields selected
+# for partial responses. The ETags are weak: they stand for the content, not
+# the bytes, which differ with the Content-Encoding negotiated, and a 200
+# and a 304 for the same content must carry the same one.
+
+# Post fields ETags are computed from, read whatever fields were asked for
+ETAG_FIELDS = ("id", "updated_at")
+
+def timestamp_us(dt):
+    return int(dt.timestamp() * 1_000_000)
+
+def fields_tag(fields):
+    return hashlib.sha256(",".join(fields).encode()).hexdigest()[:8]
+
+# `fields` is the selection of a partial response, None for full posts
+def post_etag(post, fields=None):
+    etag = f'{post["id"]}-{timestamp_us(post["updated_at"])}'
+    if fields is not None:
+        etag = f"{etag}-{fields_tag(fields)}"
+    return f'W/"{etag}"'
+
+def list_etag(page, fields=None):
+    fingerprint = json.dumps([
+        fields,
+        [[post["id"], timestamp_us(post["updated_at"])] for post in page["posts"]],
+        page["total_count"],
+        page["page"],
+        page["page_size"],
+        page["total_pages"],
+        page["total_count_exact"],
+        page["next_cursor"],
+    ])
+    return f'W/"{hashlib.sha256(fingerprint.encode()).hexdigest()[:32]}"'
+
+def opaque_tag(etag):
+    return etag[2:] if etag.startswith("W/") else etag
+
+# If-None-Match uses the weak comparison, so W/ prefixes are ignored
+def etag_matches(if_none_match, etag):
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    etag = opaque_tag(etag)
+    return any(opaque_tag(tag.strip()) == etag for tag in if_none_match.split(","))
+
+# Responses vary per viewer, and clients must revalidate before reusing them
+def cache_headers(etag):
+    return {
+        "ETag": etag,
+        "Cache-Control": "private, no-cache",
+        "Vary": "Authorization",
+    }
+
+# Recently served list pages per viewer. All pages of a viewer sit under one
+# entry so their writes drop them at once; each page also expires on its own
+# after ttl, which bounds how late other users' writes show up.
+class ListPageCache:
+    WRITE_STRIPES = 1024
+
+    def __init__(self, maxsize=10000, ttl=5.0, pages_per_viewer=16):
+        self.ttl = ttl
+        self.pages_per_viewer = pages_per_viewer
+        self.hits = 0
+        self.misses = 0
+        self._viewers = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._write_stripes = [0] * self.WRITE_STRIPES
+
+    def get(self, viewer_id, key):
+        pages = self._viewers.get(viewer_id)
+        entry = pages.get(key) if pages else None
+        if entry is None or entry[0] <= time.monotonic():
+            self.misses += 1
+            return None
+        self.hits += 1
+        return entry[1]
+
+    # Taken before fetching a page and passed to set(), which drops the page
+    # if the viewer wrote in between
+    def write_stripe(self, viewer_id):
+        return self._write_stripes[viewer_id % self.WRITE_STRIPES]
+
+    def set(self, viewer_id, key, value, stripe):
+        if self.write_stripe(viewer_id) != stripe:
+            return
+        pages = self._viewers.get(viewer_id) or {}
+        pages.pop(key, None)
+        pages[key] = (time.monotonic() + self.ttl, value)
+        while len(pages) > self.pages_per_viewer:
+            del pages[next(iter(pages))]
+        self._viewers.set(viewer_id, pages)
+
+    def invalidate(self, viewer_id):
+        self._write_stripes[viewer_id % self.WRITE_STRIPES] += 1
+        self._viewers.pop(viewer_id)
+
+    def stats(self):
+        return {
+            "viewers": len(self._viewers),
+            "maxsize": self._viewers.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
@@ -1,62 +1,270 @@
+from contextlib import asynccontextmanager
 from datetime import datetime, timedelta
-from fastapi import FastAPI, Depends, HTTPException, status, Query, Path
+from fastapi import FastAPI, Depends, HTTPException, status, Query, Path, Request, Response, Header
+from fastapi.responses import JSONResponse, StreamingResponse
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
 import httpx
+import math
+import os
 from typing import List, Optional
 
-from schemas import PostCreate, PostUpdate, Post, PaginatedPosts
-from grpc_client import PostServiceClient
+from schemas import (
+    PostCreate, PostUpdate, Post, PaginatedPosts, CountMode, TagMatch, BatchPosts, BulkCreateResult,
+    TagFacets, SearchResults
+)
+from grpc_client import (
+    PostServiceClient, PostServiceError, PostServiceUnavailable, POST_FIELDS, union_fields, narrow_post
+)
+from cache import TTLCache
+from singleflight import SingleFlight
+from http_cache import ListPageCache, ETAG_FIELDS, post_etag, list_etag, etag_matches, cache_headers
+from fast_json import FastJSONResponse, json_response, ndjson_line
+from compression import CompressionMiddleware
+from resilience import request_deadline, start_request_deadline, REQUEST_TIMEOUT_HEADER
 
-app = FastAPI()
-USER_SERVICE_URL = "http://user_service:8001"
+# Opens the user_service connection pool and the post_service channels on
+# startup and closes them on shutdown
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global user_service_client
+    user_service_client = httpx.AsyncClient(
+        base_url=USER_SERVICE_URL,
+        http2=USER_SERVICE_HTTP2,
+        limits=httpx.Limits(
+            max_connections=USER_SERVICE_MAX_CONNECTIONS,
+            max_keepalive_connections=USER_SERVICE_MAX_KEEPALIVE,
+            keepalive_expiry=USER_SERVICE_KEEPALIVE_EXPIRY,
+        ),
+        timeout=httpx.Timeout(USER_SERVICE_TIMEOUT, connect=USER_SERVICE_CONNECT_TIMEOUT),
+    )
+    await post_service.connect()
+    try:
+        yield
+    finally:
+        await post_service.close()
+        await user_service_client.aclose()
+
+app = FastAPI(default_response_class=FastJSONResponse, lifespan=lifespan)
+
+# Response compression {
+# Encodings offered in order of preference, empty to turn compression off;
+# br needs the brotli package. Compression runs on the event loop, so the
+# levels default to the cheapest: they shrink list pages about 3x, higher
+# ones save a few percent more for several times the CPU (see
+# benchmarks/bench_compression.py).
+COMPRESSION_ENCODINGS = [
+    encoding.strip() for encoding in os.getenv("COMPRESSION_ENCODINGS", "br,gzip").split(",") if encoding.strip()
+]
+COMPRESSION_MINIMUM_SIZE = int(os.getenv("COMPRESSION_MINIMUM_SIZE", "1024"))
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", "1"))
+BROTLI_QUALITY = int(os.getenv("BROTLI_QUALITY", "1"))
+# }
+
+app.add_middleware(
+    CompressionMiddleware,
+    encodings=COMPRESSION_ENCODINGS,
+    minimum_size=COMPRESSION_MINIMUM_SIZE,
+    gzip_level=GZIP_LEVEL,
+    brotli_quality=BROTLI_QUALITY
+)
+
+# user_service HTTP client {
+USER_SERVICE_URL = os.getenv("USER_SERVICE_URL", "http://user_service:8001")
+USER_SERVICE_MAX_CONNECTIONS = int(os.getenv("USER_SERVICE_MAX_CONNECTIONS", "100"))
+USER_SERVICE_MAX_KEEPALIVE = int(os.getenv("USER_SERVICE_MAX_KEEPALIVE", "20"))
+USER_SERVICE_KEEPALIVE_EXPIRY = float(os.getenv("USER_SERVICE_KEEPALIVE_EXPIRY", "30"))
+USER_SERVICE_TIMEOUT = float(os.getenv("USER_SERVICE_TIMEOUT", "5"))
+USER_SERVICE_CONNECT_TIMEOUT = float(os.getenv("USER_SERVICE_CONNECT_TIMEOUT", "2"))
+USER_SERVICE_HTTP2 = os.getenv("USER_SERVICE_HTTP2", "false").lower() == "true"
+# }
+
+# Shared connection pool, opened on startup and closed on shutdown
+user_service_client: Optional[httpx.AsyncClient] = None
+
+# Resolved users keyed by login {
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "10000"))
+USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", "60"))
+user_cache = TTLCache(maxsize=USER_CACHE_SIZE, ttl=USER_CACHE_TTL)
+# Concurrent cache misses for one login share a single lookup
+user_flights = SingleFlight()
+# }
 
 # Initialize gRPC client
 post_service = PostServiceClient()
 
+# GET /posts pages per viewer {
+# A viewer's own writes drop their pages at once; other users' writes show
+# up after LIST_CACHE_TTL at the latest
+LIST_CACHE_SIZE = int(os.getenv("LIST_CACHE_SIZE", "10000"))
+LIST_CACHE_TTL = float(os.getenv("LIST_CACHE_TTL", "5"))
+LIST_CACHE_PAGES_PER_VIEWER = int(os.getenv("LIST_CACHE_PAGES_PER_VIEWER", "16"))
+list_cache = ListPageCache(
+    maxsize=LIST_CACHE_SIZE, ttl=LIST_CACHE_TTL, pages_per_viewer=LIST_CACHE_PAGES_PER_VIEWER
+)
+# }
+
+MAX_BATCH_GET_SIZE = int(os.getenv("MAX_BATCH_GET_SIZE", "100"))
+MAX_BULK_CREATE_SIZE = int(os.getenv("MAX_BULK_CREATE_SIZE", "10000"))
+# NDJSON lines sent per chunk by GET /posts:export
+EXPORT_CHUNK_SIZE = int(os.getenv("EXPORT_CHUNK_SIZE", "100"))
+
 # JWT {
 SECRET_KEY = "JOPAAAAAAAA"
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
+
+# "lookup" resolves the user through user_service on every request,
+# "claims" embeds id, login and profile version in the token so post
+# endpoints can authorize without calling user_service
+AUTH_TOKEN_MODE = os.getenv("AUTH_TOKEN_MODE", "lookup")
 # }
 
+# Latest profile version per login, fetched from user_service when missing;
+# tokens carrying another version are rejected. Updates through this worker
+# apply at once, updates through other workers or replicas once the entry
+# expires, so PROFILE_VERSION_TTL bounds how long an outdated token works.
+PROFILE_VERSION_TTL = float(os.getenv("PROFILE_VERSION_TTL", str(USER_CACHE_TTL)))
+profile_versions = TTLCache(maxsize=USER_CACHE_SIZE, ttl=PROFILE_VERSION_TTL)
+
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="login")
 
+# Backend calls made while handling a request share its deadline
+@app.middleware("http")
+async def apply_request_deadline(request: Request, call_next):
+    token = start_request_deadline(request.headers.get(REQUEST_TIMEOUT_HEADER))
+    try:
+        return await call_next(request)
+    finally:
+        request_deadline.reset(token)
+
+@app.exception_handler(PostServiceError)
+async def post_service_error_handler(request: Request, exc: PostServiceError):
+    headers = None
+    if isinstance(exc, PostServiceUnavailable) and exc.retry_after is not None:
+        headers = {"Retry-After": str(math.ceil(exc.retry_after))}
+    return JSONResponse(status_code=exc.status_code, content={"detail": str(exc)}, headers=headers)
+
 def create_access_token(data: dict):
     to_encode = data.copy()
     expire = datetime.now() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     to_encode.update({"exp": expire})
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
-async def get_current_user(token: str = Depends(oauth2_scheme)):
-    credentials_exception = HTTPException(
+def credentials_exception(detail="Could not validate credentials"):
+    return HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
-        detail="Could not validate credentials",
+        detail=detail,
         headers={"WWW-Authenticate": "Bearer"},
     )
+
+def decode_access_token(token: str):
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        login: str = payload.get("sub")
-        if login is None:
-            raise credentials_exception
     except JWTError:
-        raise credentials_exception
+        raise credentials_exception()
+    if payload.get("sub") is None:
+        raise credentials_exception()
+    return payload
 
-    async with httpx.AsyncClient() as client:
-        response = await client.get(f"{USER_SERVICE_URL}/users/{login}")
+def create_claims_token(user: dict):
+    return create_access_token(data={
+        "sub": user["login"],
+        "uid": user["id"],
+        "pv": user["updated_at"],
+    })
+
+async def fetch_user(login: str):
+    response = await user_service_client.get(f"/users/{login}")
     
     if response.status_code != 200:
-        raise credentials_exception
+        raise credentials_exception()
     
-    return response.json()
+    user = response.json()
+    user_cache.set(login, user)
+    profile_versions.set(login, user["updated_at"])
+    return user
+
+def version_time(version):
+    try:
+        return datetime.fromisoformat(version.replace("Z", "+00:00"))
+    except (AttributeError, ValueError):
+        return None
+
+# Versions are updated_at timestamps; when they do not compare, assume the
+# token may be newer so it gets checked rather than rejected
+def may_be_newer(version, than):
+    version, than = version_time(version), version_time(than)
+    try:
+        return version is None or than is None or version > than
+    except TypeError:
+        return True
+
+# Claims tokens carry the profile version they were issued for. One older
+# than the version this worker knows is rejected as is; one this worker
+# cannot judge (nothing cached, or newer, e.g. after an update made through
+# another worker) is checked against user_service once.
+async def check_token_version(payload):
+    login = payload["sub"]
+    token_version = payload.get("pv")
+    known_version = profile_versions.get(login)
+    if known_version == token_version:
+        return
+
+    if known_version is None or may_be_newer(token_version, known_version):
+        user = await user_flights.do(login, lambda: fetch_user(login))
+        if user["updated_at"] == token_version:
+            return
+    raise credentials_exception("Token is outdated, please log in again")
+
+async def get_current_user(token: str = Depends(oauth2_scheme)):
+    payload = decode_access_token(token)
+    login = payload["sub"]
+    if "uid" in payload:
+        await check_token_version(payload)
+
+    user = user_cache.get(login)
+    if user is not None:
+        return user
+
+    return await user_flights.do(login, lambda: fetch_user(login))
+
+# ?fields=id,title,tags on post reads: posts come back with just those
+# fields, and post_service skips the other columns
+def requested_fields(
+    fields: Optional[str] = Query(None, description="Comma separated post fields to return, every field if omitted")
+):
+    names = [name.strip() for name in (fields or "").split(",") if name.strip()]
+    if not names:
+        return None
+    unknown = set(names).difference(POST_FIELDS)
+    if unknown:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown fields: {', '.join(sorted(unknown))}"
+        )
+    return union_fields(names)
+
+async def get_live_user(token: str = Depends(oauth2_scheme)):
+    payload = decode_access_token(token)
+    user = await fetch_user(payload["sub"])
+    if "uid" in payload and user["updated_at"] != payload.get("pv"):
+        raise credentials_exception("Token is outdated, please log in again")
+    return user
+
+# Identity for post endpoints: taken from token claims when present,
+# otherwise resolved like get_current_user
+async def get_current_identity(token: str = Depends(oauth2_scheme)):
+    payload = decode_access_token(token)
+    if "uid" not in payload:
+        return await get_current_user(token)
+
+    await check_token_version(payload)
+    return {"id": payload["uid"], "login": payload["sub"]}
 
 @app.post("/register")
 async def register_proxy(user_data: dict):
-    async with httpx.AsyncClient() as client:
-        response = await client.post(
-            f"{USER_SERVICE_URL}/register",
-            json=user_data
-        )
+    response = await user_service_client.post("/register", json=user_data)
     if response.status_code != 200:
         raise HTTPException(
             status_code=response.status_code,
@@ -66,11 +274,7 @@ async def register_proxy(user_data: dict):
 
 @app.post("/login")
 async def login_proxy(credentials: dict):
-    async with httpx.AsyncClient() as client:
-        response = await client.post(
-            f"{USER_SERVICE_URL}/login",
-            json=credentials
-        )
+    response = await user_service_client.post("/login", json=credentials)
     
     if response.status_code != 200:
         raise HTTPException(
@@ -78,16 +282,20 @@ async def login_proxy(credentials: dict):
             detail="Invalid credentials"
         )
     
-    access_token = create_access_token(data={"sub": credentials["login"]})
+    if AUTH_TOKEN_MODE == "claims":
+        access_token = create_claims_token(await fetch_user(credentials["login"]))
+    else:
+        access_token = create_access_token(data={"sub": credentials["login"]})
     return {"access_token": access_token, "token_type": "bearer"}
 
 @app.get("/profile")
-async def get_profile_proxy(current_user: dict = Depends(get_current_user)):
+async def get_profile_proxy(current_user: dict = Depends(get_live_user)):
     return current_user
 
 @app.put("/profile")
 async def update_profile_proxy(
     update_data: dict,
+    response: Response,
     current_user: dict = Depends(get_current_user)
 ):
     if "login" in update_data:
@@ -96,193 +304,313 @@ async def update_profile_proxy(
             detail="Cannot change login"
         )
 
-    async with httpx.AsyncClient() as client:
-        response = await client.put(
-            f"{USER_SERVICE_URL}/users/{current_user['login']}",
-            json=update_data
-        )
+    user_response = await user_service_client.put(
+        f"/users/{current_user['login']}",
+        json=update_data
+    )
+    user_cache.pop(current_user["login"])
     
-    if response.status_code != 200:
+    if user_response.status_code != 200:
         raise HTTPException(
-            status_code=response.status_code,
-            detail=response.json().get("detail", "Update failed")
+            status_code=user_response.status_code,
+            detail=user_response.json().get("detail", "Update failed")
         )
     
-    return response.json()
+    user = user_response.json()
+    profile_versions.set(user["login"], user["updated_at"])
+    if AUTH_TOKEN_MODE == "claims":
+        response.headers["X-Access-Token"] = create_claims_token(user)
+    return user
 
 @app.get("/health")
 async def health_check():
     return {"status": "ok"}
 
+# post_service stats are null when it cannot be reached
+@app.get("/metrics")
+async def metrics():
+    try:
+        post_service_stats = await post_service.get_stats()
+    except PostServiceError:
+        post_service_stats = None
+
+    return {
+        "user_cache": user_cache.stats(),
+        "list_cache": list_cache.stats(),
+        "single_flight": {
+            "user_service": user_flights.stats(),
+            "post_service": post_service.flights.stats()
+        },
+        "post_service_client": post_service.resilience_stats(),
+        "post_service": post_service_stats
+    }
+
 # Post API endpoints
 
 @app.post("/posts", response_model=Post, status_code=status.HTTP_201_CREATED)
 async def create_post(
     post_data: PostCreate,
-    current_user: dict = Depends(get_current_user)
+    current_user: dict = Depends(get_current_identity)
 ):
-    try:
-        user_id = current_user.get("id")
-        if not user_id:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="User ID not found"
-            )
-        
-        result = post_service.create_post(
-            title=post_data.title,
-            description=post_data.description,
-            creator_id=user_id,
-            is_private=post_data.is_private,
-            tags=post_data.tags
+    user_id = current_user.get("id")
+    if not user_id:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="User ID not found"
         )
-        
-        return result
-    except Exception as e:
+    
+    result = await post_service.create_post(
+        title=post_data.title,
+        description=post_data.description,
+        creator_id=user_id,
+        is_private=post_data.is_private,
+        tags=post_data.tags
+    )
+    list_cache.invalidate(user_id)
+    
+    return result
+
+# Declared before /posts/{post_id}, which would otherwise match "search"
+@app.get("/posts/search", response_model=SearchResults)
+async def search_posts(
+    q: str = Query(..., min_length=1, max_length=256, description="Search query"),
+    page_size: int = Query(10, ge=1, le=100, description="Items per page"),
+    cursor: Optional[str] = Query(None, description="Cursor from next_cursor"),
+    current_user: dict = Depends(get_current_identity)
+):
+    user_id = current_user.get("id")
+    if not user_id:
         raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=str(e)
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="User ID not found"
         )
 
+    result = await post_service.search_posts(
+        query=q,
+        user_id=user_id,
+        page_size=page_size,
+        cursor=cursor
+    )
+
+    return json_response(result)
+
 @app.get("/posts/{post_id}", response_model=Post)
 async def get_post(
     post_id: int = Path(..., gt=0),
-    current_user: dict = Depends(get_current_user)
+    fields: Optional[tuple] = Depends(requested_fields),
+    if_none_match: Optional[str] = Header(None),
+    current_user: dict = Depends(get_current_identity)
 ):
-    try:
-        # Extract user ID from the current user
-        user_id = current_user.get("id")
-        if not user_id:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="User ID not found"
-            )
-        
-        result = post_service.get_post(post_id=post_id, user_id=user_id)
-        
-        return result
-    except Exception as e:
-        error_message = str(e)
-        
-        if "Post not found" in error_message:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail=error_message
-            )
-        elif "Permission denied" in error_message:
-            raise HTTPException(
-                status_code=status.HTTP_403_FORBIDDEN,
-                detail=error_message
-            )
-        else:
-            raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail=error_message
-            )
+    # Extract user ID from the current user
+    user_id = current_user.get("id")
+    if not user_id:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="User ID not found"
+        )
+    
+    result = await post_service.get_post(
+        post_id=post_id,
+        user_id=user_id,
+        fields=union_fields(fields, ETAG_FIELDS)
+    )
+
+    # The post is fetched either way, so access is checked before a 304
+    etag = post_etag(result, fields)
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=cache_headers(etag))
+    return json_response(narrow_post(result, fields), headers=cache_headers(etag))
 
 @app.put("/posts/{post_id}", response_model=Post)
 async def update_post(
     post_data: PostUpdate,
     post_id: int = Path(..., gt=0),
-    current_user: dict = Depends(get_current_user)
+    current_user: dict = Depends(get_current_identity)
 ):
-    try:
-        user_id = current_user.get("id")
-        if not user_id:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="User ID not found"
-            )
-        
-        result = post_service.update_post(
-            post_id=post_id,
-            user_id=user_id,
-            title=post_data.title,
-            description=post_data.description,
-            is_private=post_data.is_private,
-            tags=post_data.tags
+    user_id = current_user.get("id")
+    if not user_id:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="User ID not found"
         )
-        
-        return result
-    except Exception as e:
-        error_message = str(e)
-        
-        if "Post not found" in error_message:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail=error_message
-            )
-        elif "Permission denied" in error_message:
-            raise HTTPException(
-                status_code=status.HTTP_403_FORBIDDEN,
-                detail=error_message
-            )
-        else:
-            raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail=error_message
-            )
+    
+    result = await post_service.update_post(
+        post_id=post_id,
+        user_id=user_id,
+        title=post_data.title,
+        description=post_data.description,
+        is_private=post_data.is_private,
+        tags=post_data.tags
+    )
+    list_cache.invalidate(user_id)
+    
+    return result
 
 @app.delete("/posts/{post_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_post(
     post_id: int = Path(..., gt=0),
-    current_user: dict = Depends(get_current_user)
+    current_user: dict = Depends(get_current_identity)
 ):
-    try:
-        user_id = current_user.get("id")
-        if not user_id:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="User ID not found"
-            )
-        
-        post_service.delete_post(post_id=post_id, user_id=user_id)
-        
-        return None
-    except Exception as e:
-        error_message = str(e)
-        
-        if "Post not found" in error_message:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail=error_message
-            )
-        elif "Permission denied" in error_message:
-            raise HTTPException(
-                status_code=status.HTTP_403_FORBIDDEN,
-                detail=error_message
-            )
-        else:
-            raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail=error_message
-            )
+    user_id = current_user.get("id")
+    if not user_id:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="User ID not found"
+        )
+    
+    await post_service.delete_post(post_id=post_id, user_id=user_id)
+    list_cache.invalidate(user_id)
+    
+    return None
 
 @app.get("/posts", response_model=PaginatedPosts)
 async def list_posts(
     page: int = Query(1, ge=1, description="Page number"),
     page_size: int = Query(10, ge=1, le=100, description="Items per page"),
-    current_user: dict = Depends(get_current_user)
+    cursor: Optional[str] = Query(None, description="Cursor from next_cursor, replaces page"),
+    count: CountMode = Query(CountMode.exact, description="How to compute total_count"),
+    tags: Optional[List[str]] = Query(None, description="Only posts with these tags, repeat for each tag"),
+    tag_match: TagMatch = Query(TagMatch.any, description="Match any or all of the tags"),
+    fields: Optional[tuple] = Depends(requested_fields),
+    if_none_match: Optional[str] = Header(None),
+    current_user: dict = Depends(get_current_identity)
 ):
-    try:
-        # Extract user ID from the current user
-        user_id = current_user.get("id")
-        if not user_id:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="User ID not found"
-            )
-        
+    # Extract user ID from the current user
+    user_id = current_user.get("id")
+    if not user_id:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="User ID not found"
+        )
+
+    key = (page, page_size, cursor, count.value, tuple(tags or ()), tag_match.value, fields)
+    cached = list_cache.get(user_id, key)
+    if cached is None:
+        stripe = list_cache.write_stripe(user_id)
         # Call gRPC service to list posts
-        result = post_service.list_posts(
+        result = await post_service.list_posts(
             page=page,
             page_size=page_size,
-            user_id=user_id
+            user_id=user_id,
+            cursor=cursor,
+            count_mode=count.value,
+            tags=tags,
+            tag_match=tag_match.value,
+            fields=union_fields(fields, ETAG_FIELDS)
+        )
+        etag = list_etag(result, fields)
+        if fields is not None:
+            result = dict(result, posts=[narrow_post(post, fields) for post in result["posts"]])
+        cached = (etag, result)
+        list_cache.set(user_id, key, cached, stripe)
+    etag, result = cached
+
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=cache_headers(etag))
+    return json_response(result, headers=cache_headers(etag))
+
+@app.get("/posts:batchGet", response_model=BatchPosts)
+async def batch_get_posts(
+    ids: List[int] = Query(..., description="Post IDs, repeat the parameter for each id"),
+    current_user: dict = Depends(get_current_identity)
+):
+    if len(ids) > MAX_BATCH_GET_SIZE:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"At most {MAX_BATCH_GET_SIZE} ids can be requested at once"
+        )
+
+    user_id = current_user.get("id")
+    if not user_id:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="User ID not found"
+        )
+
+    result = await post_service.batch_get_posts(post_ids=ids, user_id=user_id)
+
+    return json_response(result)
+
+@app.get("/tags", response_model=TagFacets)
+async def get_tag_facets(
+    limit: int = Query(20, ge=1, le=100, description="Number of tags to return"),
+    tags: Optional[List[str]] = Query(None, description="Count only posts with these tags"),
+    tag_match: TagMatch = Query(TagMatch.any, description="Match any or all of the tags"),
+    current_user: dict = Depends(get_current_identity)
+):
+    user_id = current_user.get("id")
+    if not user_id:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="User ID not found"
+        )
+
+    result = await post_service.get_tag_facets(
+        user_id=user_id,
+        limit=limit,
+        tags=tags,
+        tag_match=tag_match.value
+    )
+
+    return json_response(result)
+
+@app.get("/posts:export")
+async def export_posts(
+    creator_id: Optional[int] = Query(None, gt=0, description="Only this creator's posts"),
+    current_user: dict = Depends(get_current_identity)
+):
+    user_id = current_user.get("id")
+    if not user_id:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="User ID not found"
         )
-        
-        return result
-    except Exception as e:
+
+    posts = post_service.stream_posts(user_id=user_id, creator_id=creator_id)
+
+    # Pull the first post before answering, so a failing backend still gets
+    # a proper error status instead of a truncated 200
+    try:
+        first_post = await posts.__anext__()
+    except StopAsyncIteration:
+        first_post = None
+
+    async def ndjson_chunks():
+        if first_post is None:
+            return
+        chunk = [ndjson_line(first_post)]
+        async for post in posts:
+            chunk.append(ndjson_line(post))
+            if len(chunk) >= EXPORT_CHUNK_SIZE:
+                yield b"".join(chunk)
+                chunk = []
+        if chunk:
+            yield b"".join(chunk)
+
+    return StreamingResponse(ndjson_chunks(), media_type="application/x-ndjson")
+
+@app.post("/posts:bulk", response_model=BulkCreateResult)
+async def bulk_create_posts(
+    posts_data: List[PostCreate],
+    current_user: dict = Depends(get_current_identity)
+):
+    if len(posts_data) > MAX_BULK_CREATE_SIZE:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"At most {MAX_BULK_CREATE_SIZE} posts can be created at once"
+        )
+
+    user_id = current_user.get("id")
+    if not user_id:
         raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=str(e)
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="User ID not found"
         )
+
+    result = await post_service.bulk_create_posts(
+        posts=[post.dict() for post in posts_data],
+        creator_id=user_id
+    )
+    list_cache.invalidate(user_id)
+
+    return result
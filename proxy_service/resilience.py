@@ -0,0 +1,139 @@
+import contextvars
+import math
+import os
+import random
+import time
+
+# Deadlines, retry throttling and circuit breaking for calls to post_service.
+# The proxy runs on a single event loop, so none of this needs locking.
+
+# Request deadlines {
+# Time budget of one proxy request, shared by every backend call it makes.
+# Clients can ask for less with an X-Request-Timeout header in seconds.
+REQUEST_TIMEOUT = float(os.getenv("REQUEST_TIMEOUT", "30"))
+REQUEST_TIMEOUT_HEADER = "X-Request-Timeout"
+# }
+
+# Monotonic time the current request must be answered by, None outside requests
+request_deadline = contextvars.ContextVar("request_deadline", default=None)
+
+def start_request_deadline(requested_timeout=None):
+    timeout = REQUEST_TIMEOUT
+    try:
+        requested = float(requested_timeout) if requested_timeout else None
+    except ValueError:
+        requested = None
+    if requested is not None and math.isfinite(requested) and requested > 0:
+        timeout = min(requested, REQUEST_TIMEOUT)
+    return request_deadline.set(time.monotonic() + timeout)
+
+# Seconds left of the current request's budget, None outside requests
+def remaining_time():
+    deadline = request_deadline.get()
+    if deadline is None:
+        return None
+    return deadline - time.monotonic()
+
+# Timeout for one backend call: its own limit, cut to what is left of the
+# request's budget
+def call_timeout(limit):
+    remaining = remaining_time()
+    if remaining is None:
+        return limit
+    return min(limit, remaining)
+
+# "Full jitter" exponential backoff, so clients retrying after the same
+# failure spread out instead of arriving together
+def backoff_delay(attempt, base, cap):
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+# Token bucket in the style of gRPC retry throttling: every failed attempt
+# takes a token, every other answer gives back token_ratio of one, and
+# retries are only allowed while more than half the bucket is left. When
+# post_service fails most calls, retries stop instead of multiplying load.
+class RetryBudget:
+    def __init__(self, max_tokens=10, token_ratio=0.1):
+        self.max_tokens = max_tokens
+        self.token_ratio = token_ratio
+        self.tokens = max_tokens
+        self.retries = 0
+        self.throttled = 0
+
+    def record_success(self):
+        self.tokens = min(self.max_tokens, self.tokens + self.token_ratio)
+
+    def record_failure(self):
+        self.tokens = max(0, self.tokens - 1)
+
+    def try_retry(self):
+        if self.tokens > self.max_tokens / 2:
+            self.retries += 1
+            return True
+        self.throttled += 1
+        return False
+
+    def stats(self):
+        return {
+            "tokens": round(self.tokens, 2),
+            "max_tokens": self.max_tokens,
+            "retries": self.retries,
+            "throttled": self.throttled,
+        }
+
+# Opens after failure_threshold consecutive failures and rejects calls
+# without trying for reset_timeout seconds. Then one probe call is let
+# through: success closes the circuit, failure opens it again.
+class CircuitBreaker:
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold=5, reset_timeout=10.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.rejected = 0
+        self._opened_at = 0.0
+        self._probe_started_at = None
+
+    def allow(self):
+        now = time.monotonic()
+        if self.state == self.OPEN:
+            if now - self._opened_at < self.reset_timeout:
+                self.rejected += 1
+                return False
+            self.state = self.HALF_OPEN
+            self._probe_started_at = None
+
+        if self.state == self.HALF_OPEN:
+            # A probe that never reported back (e.g. cancelled) frees its slot
+            # after reset_timeout
+            if self._probe_started_at is not None and now - self._probe_started_at < self.reset_timeout:
+                self.rejected += 1
+                return False
+            self._probe_started_at = now
+        return True
+
+    def record_success(self):
+        self.state = self.CLOSED
+        self.failures = 0
+        self._probe_started_at = None
+
+    def record_failure(self):
+        self.failures += 1
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            self.state = self.OPEN
+            self._opened_at = time.monotonic()
+            self._probe_started_at = None
+
+    # Seconds until the next probe may go through
+    def retry_after(self):
+        return max(0.0, self._opened_at + self.reset_timeout - time.monotonic())
+
+    def stats(self):
+        return {
+            "state": self.state,
+            "failures": self.failures,
+            "rejected": self.rejected,
+        }
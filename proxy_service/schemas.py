@@ -1,4 +1,5 @@
 from datetime import datetime
+from enum import Enum
 from pydantic import BaseModel, Field
 from typing import List, Optional
 
@@ -23,9 +24,51 @@ class Post(PostBase):
     created_at: datetime
     updated_at: datetime
 
+class CountMode(str, Enum):
+    exact = "exact"
+    cached = "cached"
+    none = "none"
+
+class TagMatch(str, Enum):
+    any = "any"
+    all = "all"
+
 class PaginatedPosts(BaseModel):
     posts: List[Post]
-    total_count: int
+    total_count: Optional[int]
     page: int
     page_size: int
-    total_pages: int
+    total_pages: Optional[int]
+    total_count_exact: bool = True
+    next_cursor: Optional[str] = None
+
+class SearchHit(BaseModel):
+    post: Post
+    rank: float
+
+class SearchResults(BaseModel):
+    hits: List[SearchHit]
+    next_cursor: Optional[str] = None
+    truncated: bool = False
+
+class BatchPosts(BaseModel):
+    posts: List[Post]
+    not_found_ids: List[int] = []
+    denied_ids: List[int] = []
+
+class BulkCreateItemResult(BaseModel):
+    index: int
+    id: Optional[int] = None
+    error: Optional[str] = None
+
+class BulkCreateResult(BaseModel):
+    created_count: int
+    failed_count: int
+    results: List[BulkCreateItemResult]
+
+class TagFacet(BaseModel):
+    tag: str
+    count: int
+
+class TagFacets(BaseModel):
+    facets: List[TagFacet]
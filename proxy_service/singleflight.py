@@ -0,0 +1,39 @@
+import asyncio
+
+# Merges identical concurrent calls: the first caller for a key starts the
+# call, callers arriving while it runs wait for the same result (or
+# exception). Nothing is kept once the call finishes, so unlike a cache it
+# never returns data older than the requests waiting for it.
+class SingleFlight:
+    def __init__(self):
+        self.calls = 0
+        self.merged = 0
+        self._inflight = {}
+
+    async def do(self, key, fn, timeout=None):
+        task = self._inflight.get(key)
+        if task is None:
+            self.calls += 1
+            task = asyncio.get_running_loop().create_task(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda done: self._finish(key, done))
+        else:
+            self.merged += 1
+
+        # A waiter going away (e.g. the client disconnected, or its timeout
+        # ran out) must not cancel the call for the others
+        return await asyncio.wait_for(asyncio.shield(task), timeout)
+
+    def _finish(self, key, task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        # Marks the exception as retrieved when every waiter was cancelled
+        if not task.cancelled():
+            task.exception()
+
+    def stats(self):
+        return {
+            "in_flight": len(self._inflight),
+            "calls": self.calls,
+            "merged": self.merged,
+        }
@@ -82,3 +82,31 @@ def test_invalid_login(registered_user):
         }
     )
     assert response.status_code == 401
+
+def test_profile_reflects_update_after_cached_lookup(auth_token):
+    headers = {"Authorization": f"Bearer {auth_token}"}
+    response = requests.get(f"{BASE_URL}/profile", headers=headers)
+    assert response.status_code == 200
+
+    new_name = "Cached_" + fake.first_name()
+    response = requests.put(
+        f"{BASE_URL}/profile",
+        json={"first_name": new_name},
+        headers=headers
+    )
+    assert response.status_code == 200
+
+    response = requests.get(f"{BASE_URL}/profile", headers=headers)
+    assert response.status_code == 200
+    assert response.json()["first_name"] == new_name
+
+def test_user_cache_metrics(auth_token):
+    headers = {"Authorization": f"Bearer {auth_token}"}
+    requests.get(f"{BASE_URL}/profile", headers=headers)
+    requests.get(f"{BASE_URL}/profile", headers=headers)
+
+    response = requests.get(f"{BASE_URL}/metrics")
+    assert response.status_code == 200
+    stats = response.json()["user_cache"]
+    assert stats["hits"] >= 1
+    assert stats["misses"] >= 1
@@ -1,5 +1,9 @@
+import json
 import pytest
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
 from faker import Faker
 import requests
 
@@ -118,6 +122,270 @@ def test_list_posts(auth_token, created_post):
     assert response.json()["page_size"] == 5
 
 
+def test_list_posts_json(auth_token, created_post):
+    headers = {"Authorization": f"Bearer {auth_token}"}
+    response = requests.get(f"{BASE_URL}/posts", headers=headers)
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/json"
+
+    post = next(post for post in response.json()["posts"] if post["id"] == created_post["id"])
+    assert post == created_post
+    datetime.fromisoformat(post["created_at"])
+
+def test_list_posts_cursor(auth_token):
+    headers = {"Authorization": f"Bearer {auth_token}"}
+    for i in range(3):
+        post = {"title": f"Cursor post {i}", "description": fake.paragraph()}
+        response = requests.post(f"{BASE_URL}/posts", json=post, headers=headers)
+        assert response.status_code == 201
+
+    response = requests.get(f"{BASE_URL}/posts?page_size=2", headers=headers)
+    assert response.status_code == 200
+    first_page = response.json()
+    assert first_page["next_cursor"]
+
+    response = requests.get(
+        f"{BASE_URL}/posts",
+        params={"page_size": 2, "cursor": first_page["next_cursor"]},
+        headers=headers
+    )
+    assert response.status_code == 200
+    second_page = response.json()
+    first_ids = {post["id"] for post in first_page["posts"]}
+    assert len(second_page["posts"]) > 0
+    assert not first_ids & {post["id"] for post in second_page["posts"]}
+
+    response = requests.get(f"{BASE_URL}/posts?cursor=garbage", headers=headers)
+    assert response.status_code == 400
+
+def test_list_posts_count_modes(auth_token, created_post):
+    headers = {"Authorization": f"Bearer {auth_token}"}
+    response = requests.get(f"{BASE_URL}/posts?count=none", headers=headers)
+    assert response.status_code == 200
+    assert response.json()["total_count"] is None
+    assert response.json()["total_count_exact"] is False
+    assert len(response.json()["posts"]) > 0
+
+    response = requests.get(f"{BASE_URL}/posts?count=cached", headers=headers)
+    assert response.status_code == 200
+    assert response.json()["total_count"] > 0
+
+def test_batch_get_posts(auth_token, created_post):
+    headers = {"Authorization": f"Bearer {auth_token}"}
+    missing_id = 2_000_000_000
+    response = requests.get(
+        f"{BASE_URL}/posts:batchGet",
+        params={"ids": [created_post["id"], missing_id]},
+        headers=headers
+    )
+    assert response.status_code == 200
+    assert [post["id"] for post in response.json()["posts"]] == [created_post["id"]]
+    assert response.json()["not_found_ids"] == [missing_id]
+    assert response.json()["denied_ids"] == []
+
+def test_export_posts(auth_token, created_post):
+    headers = {"Authorization": f"Bearer {auth_token}"}
+    response = requests.get(
+        f"{BASE_URL}/posts:export",
+        params={"creator_id": created_post["creator_id"]},
+        headers=headers,
+        stream=True
+    )
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    posts = [json.loads(line) for line in response.iter_lines() if line]
+    assert created_post["id"] in {post["id"] for post in posts}
+    assert all(post["creator_id"] == created_post["creator_id"] for post in posts)
+
+def test_bulk_create_posts(auth_token):
+    headers = {"Authorization": f"Bearer {auth_token}"}
+    posts = [
+        {"title": f"Bulk post {i}", "description": fake.paragraph(), "tags": ["bulk"]}
+        for i in range(50)
+    ]
+    response = requests.post(f"{BASE_URL}/posts:bulk", json=posts, headers=headers)
+    assert response.status_code == 200
+    assert response.json()["created_count"] == 50
+    assert response.json()["failed_count"] == 0
+
+    results = response.json()["results"]
+    assert [result["index"] for result in results] == list(range(50))
+    response = requests.get(f"{BASE_URL}/posts/{results[3]['id']}", headers=headers)
+    assert response.status_code == 200
+    assert response.json()["title"] == "Bulk post 3"
+
+def test_list_posts_by_tags(auth_token):
+    headers = {"Authorization": f"Bearer {auth_token}"}
+    red, blue = f"red-{fake.uuid4()}", f"blue-{fake.uuid4()}"
+    for tags in ([red], [blue], [red, blue]):
+        post = {"title": fake.sentence(), "description": fake.paragraph(), "tags": tags}
+        response = requests.post(f"{BASE_URL}/posts", json=post, headers=headers)
+        assert response.status_code == 201
+
+    response = requests.get(f"{BASE_URL}/posts", params={"tags": [red, blue]}, headers=headers)
+    assert response.status_code == 200
+    assert response.json()["total_count"] == 3
+
+    response = requests.get(
+        f"{BASE_URL}/posts", params={"tags": [red, blue], "tag_match": "all"}, headers=headers
+    )
+    assert response.status_code == 200
+    assert response.json()["total_count"] == 1
+    assert sorted(response.json()["posts"][0]["tags"]) == sorted([red, blue])
+
+def test_tag_facets(auth_token):
+    headers = {"Authorization": f"Bearer {auth_token}"}
+    topic, other = f"topic-{fake.uuid4()}", f"other-{fake.uuid4()}"
+    for tags in ([topic, other], [topic, other], [topic]):
+        post = {"title": fake.sentence(), "description": fake.paragraph(), "tags": tags}
+        requests.post(f"{BASE_URL}/posts", json=post, headers=headers)
+
+    response = requests.get(f"{BASE_URL}/tags", params={"tags": [topic]}, headers=headers)
+    assert response.status_code == 200
+    assert response.json()["facets"] == [
+        {"tag": topic, "count": 3},
+        {"tag": other, "count": 2}
+    ]
+
+def test_search_posts(auth_token):
+    headers = {"Authorization": f"Bearer {auth_token}"}
+    word = fake.uuid4().replace("-", "")
+    for i in range(3):
+        post = {"title": f"Searchable {word} {i}", "description": fake.paragraph()}
+        response = requests.post(f"{BASE_URL}/posts", json=post, headers=headers)
+        assert response.status_code == 201
+
+    response = requests.get(
+        f"{BASE_URL}/posts/search", params={"q": word, "page_size": 2}, headers=headers
+    )
+    assert response.status_code == 200
+    hits = response.json()["hits"]
+    assert len(hits) == 2
+    assert hits[0]["rank"] >= hits[1]["rank"]
+    assert response.json()["truncated"] is False
+
+    response = requests.get(
+        f"{BASE_URL}/posts/search",
+        params={"q": word, "page_size": 2, "cursor": response.json()["next_cursor"]},
+        headers=headers
+    )
+    assert response.status_code == 200
+    assert len(response.json()["hits"]) == 1
+    assert response.json()["next_cursor"] is None
+
+def test_get_post_cache_sees_updates(auth_token, created_post):
+    headers = {"Authorization": f"Bearer {auth_token}"}
+    url = f"{BASE_URL}/posts/{created_post['id']}"
+    for _ in range(3):
+        assert requests.get(url, headers=headers).status_code == 200
+
+    stats = requests.get(f"{BASE_URL}/metrics").json()["post_service"]["post_cache"]
+    assert stats["hits"] >= 2
+
+    response = requests.put(url, json={"title": "Fresh title"}, headers=headers)
+    assert response.status_code == 200
+    assert requests.get(url, headers=headers).json()["title"] == "Fresh title"
+
+def test_concurrent_get_post(auth_token, created_post):
+    headers = {"Authorization": f"Bearer {auth_token}"}
+    url = f"{BASE_URL}/posts/{created_post['id']}"
+    before = requests.get(f"{BASE_URL}/metrics").json()["single_flight"]["post_service"]
+
+    # Released together so the requests overlap at the proxy
+    start = threading.Barrier(16)
+    def get(_):
+        start.wait()
+        return requests.get(url, headers=headers)
+
+    with ThreadPoolExecutor(max_workers=16) as pool:
+        responses = list(pool.map(get, range(16)))
+
+    assert all(response.status_code == 200 for response in responses)
+    assert all(response.json()["id"] == created_post["id"] for response in responses)
+
+    stats = requests.get(f"{BASE_URL}/metrics").json()["single_flight"]["post_service"]
+    assert stats["merged"] > before["merged"]
+    assert stats["calls"] - before["calls"] < len(responses)
+    assert stats["in_flight"] == 0
+
+    channels = requests.get(f"{BASE_URL}/metrics").json()["post_service_client"]["channels"]
+    assert len(channels) >= 2
+    assert all(channel["in_flight"] == 0 for channel in channels)
+
+def test_request_deadline(auth_token, created_post):
+    headers = {"Authorization": f"Bearer {auth_token}", "X-Request-Timeout": "0.000001"}
+    response = requests.get(f"{BASE_URL}/posts/{created_post['id']}", headers=headers)
+    assert response.status_code == 504
+
+    stats = requests.get(f"{BASE_URL}/metrics").json()["post_service_client"]
+    assert stats["circuit_breaker"]["state"] == "closed"
+
+def test_get_post_conditional(auth_token, created_post):
+    headers = {"Authorization": f"Bearer {auth_token}"}
+    url = f"{BASE_URL}/posts/{created_post['id']}"
+    etag = requests.get(url, headers=headers).headers["ETag"]
+
+    response = requests.get(url, headers={**headers, "If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.headers["ETag"] == etag
+    assert response.content == b""
+
+    requests.put(url, json={"title": "New title"}, headers=headers)
+    response = requests.get(url, headers={**headers, "If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+
+def test_list_posts_conditional(auth_token):
+    headers = {"Authorization": f"Bearer {auth_token}"}
+    response = requests.get(f"{BASE_URL}/posts", headers=headers)
+    etag = response.headers["ETag"]
+    total = response.json()["total_count"]
+
+    response = requests.get(f"{BASE_URL}/posts", headers={**headers, "If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.headers["ETag"] == etag
+
+    # The viewer's own write shows up at once
+    requests.post(f"{BASE_URL}/posts", json={"title": "Another", "description": "post"}, headers=headers)
+    response = requests.get(f"{BASE_URL}/posts", headers={**headers, "If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.json()["total_count"] == total + 1
+
+def test_get_post_fields(auth_token, created_post):
+    headers = {"Authorization": f"Bearer {auth_token}"}
+    url = f"{BASE_URL}/posts/{created_post['id']}"
+    response = requests.get(f"{url}?fields=title,tags", headers=headers)
+    assert response.status_code == 200
+    assert response.json() == {"title": created_post["title"], "tags": created_post["tags"]}
+    assert response.headers["ETag"] != requests.get(url, headers=headers).headers["ETag"]
+
+    response = requests.get(f"{url}?fields=title,secret", headers=headers)
+    assert response.status_code == 400
+
+def test_list_posts_fields(auth_token, created_post):
+    headers = {"Authorization": f"Bearer {auth_token}"}
+    full = requests.get(f"{BASE_URL}/posts?page_size=5", headers=headers).json()
+    response = requests.get(f"{BASE_URL}/posts?page_size=5&fields=id,title", headers=headers)
+    assert response.status_code == 200
+
+    data = response.json()
+    assert [post["id"] for post in data["posts"]] == [post["id"] for post in full["posts"]]
+    assert all(set(post) == {"id", "title"} for post in data["posts"])
+    assert data["next_cursor"] == full["next_cursor"]
+
+def test_list_posts_compressed(auth_token):
+    headers = {"Authorization": f"Bearer {auth_token}"}
+    long_post = {"title": "Long", "description": fake.text(max_nb_chars=2000)}
+    requests.post(f"{BASE_URL}/posts", json=long_post, headers=headers)
+
+    response = requests.get(f"{BASE_URL}/posts", headers={**headers, "Accept-Encoding": "gzip"})
+    assert response.status_code == 200
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert response.json()["posts"]
+
+    response = requests.get(f"{BASE_URL}/posts", headers={**headers, "Accept-Encoding": "identity"})
+    assert "Content-Encoding" not in response.headers
+
 def test_delete_post(auth_token, created_post):
     headers = {"Authorization": f"Bearer {auth_token}"}
     response = requests.delete(f"{BASE_URL}/posts/{created_post['id']}", headers=headers)